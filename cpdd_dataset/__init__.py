@@ -1,3 +1,3 @@
-from . import config, data, intrinsics
+from . import config, data, intrinsics, projection
 
 __version__ = '0.1.1'
@@ -1,4 +1,5 @@
 from ._config import Config, Rain, Weather, City
-from ._loader import load_csv, load_df, load_txt, expand_wildcards, all, cars_for_city
+from ._loader import load_csv, load_df, load_txt, expand_wildcards, all, cars_for_city, unique, union, intersection, \
+    difference, hash_split
 
 from_folder_name = Config.from_folder_name
\ No newline at end of file
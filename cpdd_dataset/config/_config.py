@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import hashlib
+import weakref
 from enum import Enum
 from pathlib import Path
 
 from ..data import CylindricalDataFile, PinholeDataFile, SphericalDataFile
-from ..data import get_download_location
+from ..data import get_download_location, download_many
 from ..data._run_data import PoseDataFile
+from ..data._s3 import REMOTE_ROOT
 
 
 class Rain(Enum):
@@ -37,20 +40,83 @@ class City(Enum):
 
 
 class Config:
+    """
+    A simulation run.  Configs are immutable and interned: constructing the same config twice gives the same object,
+    so they can be compared, hashed, and used in sets cheaply.
+    """
+    __slots__ = ("city", "rain", "sunset", "num_cars", "num_peds", "index", "_key", "__weakref__")
 
-    def __init__(self, city: City, rain: Rain, sunset: bool, num_cars: int, num_peds: int, index: int):
+    # weak, so configs that nothing uses any more aren't kept forever
+    _interned: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
 
-        self.num_peds = num_peds
-        self.num_cars = num_cars
-        self.sunset = sunset
-        self.rain = rain
-        self.city = city
-        self.index = index
-        self.weather = Weather(rain, sunset)
+    def __new__(cls, city: City, rain: Rain, sunset: bool, num_cars: int, num_peds: int, index: int):
+        key = (city, rain, bool(sunset), int(num_cars), int(num_peds), int(index))
+
+        config = cls._interned.get(key)
+        if config is not None:
+            return config
+
+        config = super().__new__(cls)
+        for name, value in zip(Config.__slots__, key + (key,)):
+            object.__setattr__(config, name, value)
+
+        return cls._interned.setdefault(key, config)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Config is immutable, can't set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"Config is immutable, can't delete {name}")
+
+    def __reduce__(self):
+        # unpickled configs are interned too
+        return Config, self._key
+
+    def __copy__(self) -> Config:
+        return self
+
+    def __deepcopy__(self, memo) -> Config:
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, Config):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __lt__(self, other: Config) -> bool:
+        if not isinstance(other, Config):
+            return NotImplemented
+        return self.sort_key < other.sort_key
+
+    @property
+    def sort_key(self) -> tuple:
+        """
+        Orders configs by city, rain, time, cars, peds, and then index.
+        """
+        city, rain, sunset, num_cars, num_peds, index = self._key
+        return city.value, rain.value, sunset, num_cars, num_peds, index
+
+    @property
+    def weather(self) -> Weather:
+        return Weather(self.rain, self.sunset)
 
     def __repr__(self):
         return f"Config(city={self.city.name}, rain={self.rain.name}, sunset={self.sunset}, num_cars={self.num_cars}, num_peds={self.num_peds}, index={self.index})"
 
+    def stable_hash(self, salt: str = "") -> int:
+        """
+        A hash of the config that is the same across processes and Python versions, unlike hash(), for assigning
+        configs to splits.
+
+        :param salt: Changes the hash, so different salts give independent splits
+        :return: A 64 bit unsigned int
+        """
+        digest = hashlib.blake2b(f"{salt}/{self.folder_name}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
     @property
     def folder_name(self) -> str:
         if self.sunset:
@@ -68,7 +134,7 @@ class Config:
 
     @property
     def remote_location(self) -> str:
-        return "s3://cscdatasets/jventu09/cpdd_dataset/" + self.folder_name + "/"
+        return REMOTE_ROOT + self.folder_name + "/"
 
     @property
     def cylindrical_data(self) -> CylindricalDataFile:
@@ -86,11 +152,8 @@ class Config:
     def pose_data(self) -> PoseDataFile:
         return PoseDataFile(self)
 
-    def download_all(self, force: bool = False):
-        self.pose_data.download(force)
-        self.cylindrical_data.download(force)
-        self.spherical_data.download(force)
-        self.pinhole_data.download(force)
+    def download_all(self, force: bool = False, workers: int = 4):
+        download_many([self], force=force, workers=workers).raise_for_failures()
 
     @staticmethod
     def from_folder_name(name: str):
@@ -1,7 +1,8 @@
 from collections import deque
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, Iterable, List, Union
 
+import numpy as np
 import pandas
 
 from cpdd_dataset.config import City, Config, Rain
@@ -75,6 +76,36 @@ def expand_wildcards(city=None, rain=None, sunset=None, num_cars=None, num_peds=
     return [Config(item[0], item[1], item[2], item[3], item[4], item[5]) for item in done]
 
 
+_CITIES = {c.name.lower(): c for c in City}
+_RAINS = {r.name.lower(): r for r in Rain}
+_TIMES = {"sunset": True, "noon": False}
+
+
+def _names(column: pandas.Series) -> pandas.Series:
+    return column.astype(str).str.strip().str.lower()
+
+
+def _ints(column: pandas.Series) -> pandas.Series:
+    wildcard = _names(column) == "*"
+    values = pandas.to_numeric(column.where(~wildcard), errors="raise").astype("Int64")
+    return values.astype(str).where(~wildcard, "*")
+
+
+def _lookup(name: str, values: dict, kind: str):
+    if name == "*":
+        return None
+    if name not in values:
+        raise ValueError(f"{name} is not a valid {kind}")
+    return values[name]
+
+
+def _expand(key: str) -> List[Config]:
+    city, rain, time, num_cars, num_peds, index = key.split("\t")
+    return expand_wildcards(_lookup(city, _CITIES, "city"), _lookup(rain, _RAINS, "rain"),
+                            _lookup(time, _TIMES, "time"),
+                            *[None if v == "*" else int(v) for v in (num_cars, num_peds, index)])
+
+
 def load_df(df: pandas.DataFrame) -> List[Config]:
     """
     Loads a list of configs from a pandas data frame.  Both column names and values are non case sensitive.
@@ -94,49 +125,71 @@ def load_df(df: pandas.DataFrame) -> List[Config]:
     """
 
     # df.columns = map(str.lower, df.columns)
-    configs = []
+    if len(df) == 0:
+        return []
 
-    for row in df.itertuples(index=False):
-        num_cars = None if row.num_cars == "*" else int(row.num_cars)
-        num_peds = None if row.num_peds == "*" else int(row.num_peds)
-        index = None if row.index == "*" else int(row.index)
-        city_name = None if row.city == "*" else row.city.lower()
+    # rows are normalized a column at a time, and each distinct row is only parsed and expanded once
+    keys = _names(df["city"]).str.cat([_names(df["rain"]), _names(df["time"]), _ints(df["num_cars"]),
+                                       _ints(df["num_peds"]), _ints(df["index"])], sep="\t")
+    codes, uniques = pandas.factorize(keys)
+    expanded = [_expand(key) for key in uniques]
 
-        if city_name is not None:
-            for c in list(City):
-                if c.name.lower() == city_name:
-                    city = c
-                    break
-            else:
-                raise ValueError(f"{city_name} is not a valid city")
-        else:
-            city = None
+    return [config for code in codes for config in expanded[code]]
 
-        rain_name = None if row.rain == "*" else row.rain.lower()
 
-        if rain_name is not None:
-            for r in list(Rain):
-                if r.name.lower() == rain_name:
-                    rain = r
-                    break
-            else:
-                raise ValueError(f"{rain_name} is not a valid rain")
-        else:
-            rain = None
-
-        sunset_name = None if row.time == "*" else row.time.lower()
-        if sunset_name is None:
-            sunset = None
-        elif sunset_name == "sunset":
-            sunset = True
-        elif sunset_name == "noon":
-            sunset = False
-        else:
-            raise ValueError(f"{sunset_name} is not a valid time")
+def unique(configs: Iterable[Config]) -> List[Config]:
+    """
+    :return: The configs without duplicates, in the order they first appear
+    """
+    return list(dict.fromkeys(configs))
+
+
+def union(*collections: Iterable[Config]) -> List[Config]:
+    """
+    :return: The configs in any of the collections, in the order they first appear
+    """
+    return unique(c for configs in collections for c in configs)
+
+
+def intersection(configs: Iterable[Config], *others: Iterable[Config]) -> List[Config]:
+    """
+    :return: The configs of the first collection that are in all of the others, in order and without duplicates
+    """
+    keep = set.intersection(*[set(o) for o in others]) if others else None
+    return [c for c in unique(configs) if keep is None or c in keep]
+
+
+def difference(configs: Iterable[Config], *others: Iterable[Config]) -> List[Config]:
+    """
+    :return: The configs of the first collection that aren't in any of the others, in order and without duplicates
+    """
+    remove = set().union(*others)
+    return [c for c in unique(configs) if c not in remove]
+
+
+def hash_split(configs: Iterable[Config], fractions: Dict[str, float], salt: str = "") -> Dict[str, List[Config]]:
+    """
+    Splits configs by Config.stable_hash, so each config always lands in the same split for the same fractions and salt,
+    no matter what other configs are being split or their order.
+
+    :param configs: The configs to split
+    :param fractions: The fraction of configs in each split, like {"train": 0.8, "test": 0.2}, which are normalized
+    :param salt: Changes which configs land in which split
+    :return: The configs in each split, in order and without duplicates
+    """
+    total = sum(fractions.values())
+    if total <= 0:
+        raise ValueError(f"Fractions must sum to more than 0, got {fractions}")
+
+    names = list(fractions)
+    bounds = np.cumsum([fractions[n] / total for n in names]) * 2 ** 64
+    splits = {n: [] for n in names}
 
-        configs.extend(expand_wildcards(city, rain, sunset, num_cars, num_peds, index))
+    for c in unique(configs):
+        i = int(np.searchsorted(bounds, c.stable_hash(salt), side="right"))
+        splits[names[min(i, len(names) - 1)]].append(c)
 
-    return configs
+    return splits
 
 
 def load_txt(file: Union[Path, str]) -> List[Config]:
@@ -1,5 +1,22 @@
-from ._location import get_download_location, set_download_location
+from ._location import get_download_location, set_download_location, get_cache_budget, set_cache_budget
 from ._run_data import CylindricalDataFile, Data, DataFile, DataSource, PinholeDataFile, PinholeDataFileSide, \
     SphericalDataFile, SplitData
 from ._side import Side
-from ._crop import crop_pinhole_to_90
+from ._crop import crop_pinhole_to_90, crop_pinhole_to_90_batch
+from ._download import download_many, data_files, DownloadProgress, DownloadResult, DownloadError
+from ._remote import CacheStats, RemoteOptions
+from ._cache import LocalCache, get_cache
+from ._manifest import Manifest, RemoteEntry, get_manifest
+from ._async import download_many_async, get_async_filesystem
+from ._dataset import FrameDataset, FilePool
+from ._handles import SharedFile, open_shared
+from ._loader import ParallelLoader
+from ._repack import repack, RepackedFile
+from ._transcode import transcode, PRESETS, CODECS
+from ._depth import depth_to_meters, depth_to_inverse, depth_valid_mask, FAR_DEPTH
+from ._pyramid import build_pyramid
+from ._catalog import build_catalog, load_catalog, update_catalog, catalog_file
+from ._pose_index import PoseIndex, FrameRef
+from ._motion import MotionFilter
+from ._windows import WindowSampler, Window
+from ._stats import compute_stats, run_stats, stats_file, DataStats, ChannelMoments, DepthHistogram
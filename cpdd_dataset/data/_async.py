@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import s3fs
+
+from . import _transfer
+from ._download import FILE_KINDS, DownloadResult, data_files
+
+DEFAULT_CONCURRENCY = 64
+_READ_THREADS = 4
+
+_states = weakref.WeakKeyDictionary()
+_state_locks = weakref.WeakKeyDictionary()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class _LoopState:
+    def __init__(self, fs: s3fs.S3FileSystem, semaphore: asyncio.Semaphore):
+        self.fs = fs
+        self.semaphore = semaphore
+
+
+async def _loop_state() -> _LoopState:
+    """
+    The async S3 client and the semaphore bounding concurrent requests, shared by everything on the running loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop in _states:
+        return _states[loop]
+
+    # set_session yields to the loop, so other tasks would otherwise create clients of their own meanwhile
+    if loop not in _state_locks:
+        _state_locks[loop] = asyncio.Lock()
+
+    async with _state_locks[loop]:
+        if loop not in _states:
+            fs = s3fs.S3FileSystem(asynchronous=True, loop=loop,
+                                   config_kwargs={"max_pool_connections": DEFAULT_CONCURRENCY})
+            await fs.set_session()
+            _states[loop] = _LoopState(fs, asyncio.Semaphore(DEFAULT_CONCURRENCY))
+
+    return _states[loop]
+
+
+async def get_async_filesystem() -> s3fs.S3FileSystem:
+    """
+    :return: The async S3 filesystem client shared by everything on the running event loop
+    """
+    return (await _loop_state()).fs
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Runs a blocking call, like a h5py read, on the small thread pool shared by the async API.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_READ_THREADS, thread_name_prefix="cpdd_dataset")
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def fetch_file_async(remote: str, dest: Path, size: Optional[int] = None, etag: Optional[str] = None,
+                           chunk_size: int = _transfer.CHUNK_SIZE, verify: bool = True):
+    """
+    The async version of fetch_file.  Chunks are fetched concurrently, bounded by the loop's shared semaphore
+    instead of a per file thread pool.
+    """
+    state = await _loop_state()
+    fs = state.fs
+
+    if size is None:
+        info = await fs._info(remote)
+        size = info["size"]
+        etag = info.get("ETag")
+
+    etag = (etag or "").strip('"')
+
+    done, todo = await run_blocking(_transfer.prepare, dest, size, etag, chunk_size)
+    # the state file is rewritten on every chunk, one at a time
+    lock = asyncio.Lock()
+
+    async def fetch(chunk):
+        i, start, end = chunk
+        async with state.semaphore:
+            block = await fs._cat_file(remote, start=start, end=end)
+
+        if len(block) != end - start:
+            raise IOError(f"Short read of {remote} at {start}: expected {end - start} bytes, got {len(block)}")
+
+        await run_blocking(_transfer.write_chunk, dest, start, block)
+        async with lock:
+            await run_blocking(_transfer.mark_done, dest, size, etag, chunk_size, done, i)
+
+    await asyncio.gather(*[fetch(c) for c in todo])
+    await run_blocking(_transfer.finish, remote, dest, size, etag, verify)
+
+
+async def download_many_async(configs: Iterable, kinds: Sequence[str] = FILE_KINDS,
+                              force: bool = False) -> DownloadResult:
+    """
+    Downloads the data files of many configs concurrently on the running event loop.  Requests for all of the files
+    share the loop's S3 client and semaphore.  Like download_many, a file that fails is recorded in the result instead
+    of aborting the others.
+
+    :param configs: The configs to download
+    :param kinds: The kinds of data files to download, any of "pose", "cylindrical", "spherical", and "pinhole"
+    :param force: Re-download files that are already downloaded
+    :return: The downloaded, skipped, and failed files, and the transfer statistics
+    """
+    files = data_files(configs, kinds)
+    downloaded = [False] * len(files) if force else await run_blocking(lambda: [f.is_downloaded for f in files])
+
+    result = DownloadResult(skipped=[f for f, d in zip(files, downloaded) if d])
+    files = [f for f, d in zip(files, downloaded) if not d]
+    start = time.monotonic()
+
+    outcomes = await asyncio.gather(*[f.download_async(force) for f in files], return_exceptions=True)
+
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, Exception):
+            result.failed.append((file, outcome))
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            result.downloaded.append(file)
+            result.downloaded_bytes += file.download_file.stat().st_size
+
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+async def iter_frames_async(color, depth, start: int = 0, stop: Optional[int] = None,
+                            batch_size: int = 1) -> AsyncIterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Reads batches of frames without blocking the event loop.  The next batch is read while the current one is being
+    consumed.
+    """
+    if stop is None:
+        stop = color.shape[0]
+
+    def read(s):
+        e = min(s + batch_size, stop)
+        return color[s:e], depth[s:e]
+
+    starts = range(start, stop, batch_size)
+    if not starts:
+        return
+
+    pending = asyncio.ensure_future(run_blocking(read, starts[0]))
+
+    for s in starts[1:]:
+        batch = await pending
+        pending = asyncio.ensure_future(run_blocking(read, s))
+        yield batch
+
+    yield await pending
+
+
+class AsyncContext:
+    """
+    Lets a data source be used with async with.  Opening and closing files happens off the event loop.
+    """
+
+    async def __aenter__(self):
+        return await run_blocking(self.__enter__)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await run_blocking(self.__exit__, exc_type, exc_val, exc_tb)
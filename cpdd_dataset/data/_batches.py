@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+
+# one batch held by the consumer, one waiting in the queue, and one being read
+_BUFFERS = 3
+
+
+def chunk_frames(datasets: Sequence[h5py.Dataset]) -> int:
+    """
+    :return: The number of frames in the largest chunk of any of the datasets, or 1 if none are chunked
+    """
+    return max([ds.chunks[0] for ds in datasets if getattr(ds, "chunks", None) is not None] or [1])
+
+
+def batch_ranges(start: int, stop: int, batch_size: int, align: int = 1) -> List[Tuple[int, int]]:
+    """
+    Splits [start, stop) into batches whose boundaries are multiples of batch_size, which is rounded up to a multiple
+    of align.  The first and last batches may be shorter.
+    """
+    batch_size = -(-batch_size // align) * align
+    ranges = []
+
+    s = start
+    while s < stop:
+        e = min((s // batch_size + 1) * batch_size, stop)
+        ranges.append((s, e))
+        s = e
+
+    return ranges
+
+
+def coalesce(frames: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Splits frame indices into runs of consecutive frames, so each run can be read as one hyperslab.
+
+    :return: The [start, end) of each run, in the order of frames
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    if len(frames) == 0:
+        return []
+
+    breaks = np.flatnonzero(np.diff(frames) != 1) + 1
+    starts = frames[np.concatenate([[0], breaks])]
+    ends = frames[np.concatenate([breaks - 1, [len(frames) - 1]])] + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def iter_batches(datasets: Sequence[h5py.Dataset], batch_size: Optional[int] = None, start: int = 0,
+                 stop: Optional[int] = None,
+                 prefetch: bool = True,
+                 decoders: Optional[Sequence[Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]]] = None,
+                 decoded_dtype=np.float32, frames: Optional[np.ndarray] = None,
+                 ranges: Optional[Sequence[Tuple[int, int]]] = None) -> Iterator[Tuple[np.ndarray, ...]]:
+    """
+    Reads batches of frames from datasets that share their first dimension.  Batches are aligned to the datasets'
+    chunks and read with read_direct into preallocated buffers that are reused, so the arrays yielded for a batch are
+    only valid until the next batch is requested.  Copy them if they need to be kept.
+
+    :param datasets: The datasets to read, like (color, depth)
+    :param batch_size: The number of frames in each batch, rounded up to a whole number of chunks.  Only optional
+        with ranges.
+    :param start: The first frame
+    :param stop: The frame to stop before, defaults to the last frame
+    :param prefetch: Read the next batch on a background thread while the current one is being used
+    :param decoders: Optional functions, one per dataset (or None), taking (raw, out) that convert a raw batch into
+        a preallocated decoded_dtype buffer, like depth_to_meters.  Decoding happens on the prefetch thread.
+    :param decoded_dtype: The dtype of the decoded buffers
+    :param frames: Only read these frames, in this order, instead of start to stop.  Batches are batch_size frames,
+        and each run of consecutive frames is read at once.
+    :param ranges: Read each of these [start, end) ranges as a batch, in this order, instead of start to stop.  They
+        may overlap.
+    :return: An iterator of tuples of arrays, one per dataset
+    """
+    if batch_size is None and ranges is None:
+        raise ValueError("batch_size is needed unless ranges are given")
+
+    if frames is not None:
+        frames = np.asarray(frames, dtype=np.int64)
+        runs = [coalesce(frames[i:i + batch_size]) for i in range(0, len(frames), batch_size)]
+    elif ranges is not None:
+        runs = [[(int(s), int(e))] for s, e in ranges if e > s]
+    else:
+        if stop is None:
+            stop = datasets[0].shape[0]
+        runs = [[r] for r in batch_ranges(start, stop, batch_size, chunk_frames(datasets))]
+
+    if not runs:
+        return
+
+    decoders = list(decoders) if decoders is not None else [None] * len(datasets)
+    if len(decoders) != len(datasets):
+        raise ValueError(f"Got {len(decoders)} decoders for {len(datasets)} datasets")
+
+    # memmaps of repacked files can be sliced without copying, unless frames are selected
+    sliced = frames is None
+
+    if sliced and all(isinstance(ds, np.ndarray) for ds in datasets) and not any(decoders):
+        for [(s, e)] in runs:
+            yield tuple(ds[s:e] for ds in datasets)
+        return
+
+    size = max(sum(e - s for s, e in batch) for batch in runs)
+
+    def buffer(ds, decoder) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        shape = (size,) + ds.shape[1:]
+        raw = np.empty(shape, dtype=ds.dtype) if not (sliced and isinstance(ds, np.ndarray)) else None
+        decoded = np.empty(shape, dtype=decoded_dtype) if decoder is not None else None
+        return raw, decoded
+
+    buffers = [[buffer(ds, decoder) for ds, decoder in zip(datasets, decoders)]
+               for _ in range(_BUFFERS if prefetch else 1)]
+
+    def read(i: int) -> Tuple[np.ndarray, ...]:
+        n = sum(e - s for s, e in runs[i])
+        batch = []
+        for ds, decoder, (raw, decoded) in zip(datasets, decoders, buffers[i % len(buffers)]):
+            if raw is None:
+                [(s, e)] = runs[i]
+                raw = ds[s:e]
+            else:
+                offset = 0
+                for s, e in runs[i]:
+                    if isinstance(ds, np.ndarray):
+                        raw[offset:offset + e - s] = ds[s:e]
+                    else:
+                        ds.read_direct(raw, np.s_[s:e], np.s_[offset:offset + e - s])
+                    offset += e - s
+                raw = raw[:n]
+
+            batch.append(decoder(raw, decoded[:n]) if decoder is not None else raw)
+        return tuple(batch)
+
+    if not prefetch:
+        for i in range(len(runs)):
+            yield read(i)
+        return
+
+    batches = queue.Queue(maxsize=1)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for i in range(len(runs)):
+                if not put((read(i), None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+    try:
+        for _ in range(len(runs)):
+            batch, error = batches.get()
+            if error is not None:
+                raise error
+            yield batch
+    finally:
+        stopped.set()
+        thread.join()
@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import h5py
+
+from ._location import get_cache_budget, get_download_location
+
+try:
+    import fcntl
+except ImportError:
+    # Windows can't delete open files anyway
+    fcntl = None
+
+_INDEX_NAME = ".cache_index.json"
+# variants and pyramids are written next to their data file as {stem}.variant-{name}.hdf5 and {stem}.pyramid.hdf5
+_DERIVED_NAME = re.compile(r"^(.+?)\.(?:variant-.+|pyramid)\.hdf5$")
+# repacked files are written to repacked/{stem} next to their data file
+_REPACKED_DIR = "repacked"
+# how often last access times are written to the index, in seconds
+_FLUSH_INTERVAL = 30.0
+
+
+class FileLock:
+    """
+    A shared lock on a data file, which keeps it from being evicted by any process while it is held.
+    """
+
+    def __init__(self, path: Path):
+        self._fd: Optional[int] = None
+        if fcntl is not None:
+            self._fd = os.open(path, os.O_RDONLY)
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def raw_size(path: Path) -> int:
+    """
+    :return: The uncompressed size of every dataset in an HDF5 file, in bytes
+    """
+    sizes = []
+    with h5py.File(path, 'r') as f:
+        f.visititems(lambda _, obj: sizes.append(obj.size * obj.dtype.itemsize) if isinstance(obj, h5py.Dataset)
+                     else None)
+    return sum(sizes)
+
+
+def _is_counted(path: Path) -> bool:
+    # files that are still being written are counted through their reservations instead
+    if any(part.endswith(".tmp") for part in path.parts):
+        return False
+    return path.suffix in (".hdf5", ".npy") or _REPACKED_DIR in path.parts[:-1]
+
+
+def _unlink_if_unused(paths: List[Path]) -> bool:
+    """
+    Deletes a data file and the files derived from it, unless any process has any of them locked.
+
+    :return: Whether they were deleted
+    """
+    fds = []
+    try:
+        if fcntl is not None:
+            for path in paths:
+                fds.append(os.open(path, os.O_RDONLY))
+                fcntl.flock(fds[-1], fcntl.LOCK_EX | fcntl.LOCK_NB)
+        for path in paths:
+            path.unlink()
+    except OSError:
+        return False
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    for directory in {p.parent for p in paths if p.parent.parent.name == _REPACKED_DIR}:
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+    return True
+
+
+class LocalCache:
+    """
+    Tracks the data files under a download location, and evicts the least recently used ones when a download would go
+    over the cache budget.  The variants, pyramids, and repacked files derived from a data file are counted with it,
+    and evicted with it.  Files that are open in any process (through CachedH5File, RepackedFile, or FileLock) or
+    pinned in this process are never evicted, and space is reserved for this process's downloads and derived files
+    until they are written.  Last access times are kept in memory and written to the index every so often, and when the
+    process exits.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.RLock()
+        self._open: Dict[Path, int] = {}
+        self._pinned: Dict[Path, int] = {}
+        self._reserved: Dict[Path, int] = {}
+        self._last_access: Dict[str, float] = None
+        self._dirty = False
+        self._flushed = time.monotonic()
+
+    @property
+    def _index_file(self) -> Path:
+        return self.root / _INDEX_NAME
+
+    def _index(self) -> Dict[str, float]:
+        if self._last_access is None:
+            try:
+                with open(self._index_file) as f:
+                    self._last_access = json.load(f)
+            except (OSError, ValueError):
+                self._last_access = {}
+        return self._last_access
+
+    def _save_index(self, removed: Iterable[str] = ()):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_file.with_name(_INDEX_NAME + f".{os.getpid()}.tmp")
+
+        # other processes may have written accesses since the index was loaded
+        try:
+            with open(self._index_file) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        for key in removed:
+            saved.pop(key, None)
+        for key, accessed in saved.items():
+            if accessed > self._last_access.get(key, 0):
+                self._last_access[key] = accessed
+
+        with open(tmp, "w") as f:
+            json.dump(self._last_access, f)
+
+        os.replace(tmp, self._index_file)
+        self._dirty = False
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        """
+        Writes any unsaved last access times to the index.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _key(self, path: Path) -> str:
+        return Path(path).relative_to(self.root).as_posix()
+
+    def files(self) -> List[Path]:
+        """
+        :return: Every file in the cache: data files, their variants, pyramids, and repacked files, and motion masks
+        """
+        return [p for p in self.root.rglob("*") if _is_counted(p.relative_to(self.root)) and p.is_file()]
+
+    def source(self, path: Path) -> Path:
+        """
+        :return: The data file that a variant, pyramid, or repacked file was derived from, or path itself
+        """
+        path = Path(path)
+        parts = path.relative_to(self.root).parts
+        if _REPACKED_DIR in parts[:-1]:
+            i = max(i for i, part in enumerate(parts[:-1]) if part == _REPACKED_DIR)
+            return self.root.joinpath(*parts[:i], parts[i + 1] + ".hdf5")
+
+        match = _DERIVED_NAME.match(path.name)
+        if match is not None:
+            return path.with_name(match.group(1) + ".hdf5")
+        return path
+
+    def entries(self) -> Dict[Path, List[Path]]:
+        """
+        :return: The files in the cache grouped by the data file they were derived from, which are evicted together
+        """
+        entries: Dict[Path, List[Path]] = {}
+        for p in self.files():
+            entries.setdefault(self.source(p), []).append(p)
+        return entries
+
+    def usage(self) -> int:
+        """
+        :return: The total size of the files in the cache, plus the space reserved for files being written, in bytes
+        """
+        with self._lock:
+            return sum(p.stat().st_size for p in self.files()) + sum(self._reserved.values())
+
+    def last_access(self, path: Path) -> float:
+        """
+        :return: When a data file, or any file derived from it, was last used
+        """
+        with self._lock:
+            index = self._index()
+            key = self._key(self.source(path))
+            if key in index:
+                return index[key]
+        return path.stat().st_mtime
+
+    def touch(self, path: Path):
+        """
+        Records that a file was just used, and releases the space reserved for it if it was just written.
+        """
+        with self._lock:
+            self._reserved.pop(Path(path), None)
+            self._index()[self._key(self.source(path))] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._flushed >= _FLUSH_INTERVAL:
+                self._save_index()
+
+    def release(self, path: Path):
+        """
+        Releases the space reserved for a download that failed.
+        """
+        with self._lock:
+            self._reserved.pop(Path(path), None)
+
+    def is_open(self, path: Path) -> bool:
+        return self._open.get(Path(path), 0) > 0
+
+    def is_pinned(self, path: Path) -> bool:
+        return self._pinned.get(Path(path), 0) > 0
+
+    def opened(self, path: Path):
+        with self._lock:
+            path = Path(path)
+            self._open[path] = self._open.get(path, 0) + 1
+            self.touch(path)
+
+    def closed(self, path: Path):
+        with self._lock:
+            path = Path(path)
+            self._open[path] -= 1
+            if self._open[path] <= 0:
+                del self._open[path]
+
+    def pin(self, path: Path):
+        """
+        Prevents a data file from being evicted until it is unpinned.  Pins are counted.
+        """
+        with self._lock:
+            path = Path(path)
+            self._pinned[path] = self._pinned.get(path, 0) + 1
+
+    def unpin(self, path: Path):
+        with self._lock:
+            path = Path(path)
+            if self._pinned.get(path, 0) <= 1:
+                self._pinned.pop(path, None)
+            else:
+                self._pinned[path] -= 1
+
+    @contextmanager
+    def pinned(self, paths: Iterable[Path]):
+        paths = list(paths)
+        for p in paths:
+            self.pin(p)
+        try:
+            yield self
+        finally:
+            for p in paths:
+                self.unpin(p)
+
+    def evict(self, needed: int, budget: Optional[int] = None, path: Optional[Path] = None) -> List[Path]:
+        """
+        Evicts least recently used data files, with the files derived from them, until there are needed bytes free in
+        the budget, counting the space reserved for other files being written.  Data files that are open or pinned, or
+        have derived files that are, are skipped, so the cache may still be over budget afterwards.
+
+        :param needed: The number of bytes that are about to be added to the cache
+        :param budget: The cache budget, defaults to get_cache_budget().  Nothing is evicted if there is no budget.
+        :param path: The file or repacked directory being written.  needed bytes are reserved for it until it is
+            touched or released, and any existing copy of it isn't counted, since it is replaced.  The data file it is
+            derived from is never evicted.
+        :return: The evicted files
+        """
+        if budget is None:
+            budget = get_cache_budget()
+
+        with self._lock:
+            path = Path(path) if path is not None else None
+            if path is not None:
+                self._reserved.pop(path, None)
+
+            evicted = []
+            if budget is not None:
+                entries = self.entries()
+                if path is not None:
+                    for source, files in entries.items():
+                        entries[source] = [p for p in files if p != path and path not in p.parents]
+
+                sizes = {source: sum(p.stat().st_size for p in files) for source, files in entries.items()}
+                usage = sum(sizes.values()) + sum(self._reserved.values())
+
+                busy = {self.source(p) for p in list(self._open) + list(self._pinned)}
+                if path is not None:
+                    busy.add(self.source(path))
+
+                index = self._index()
+                candidates = [s for s, files in entries.items() if files and s not in busy]
+                candidates.sort(key=lambda s: index.get(self._key(s), max(p.stat().st_mtime for p in entries[s])))
+
+                removed = []
+                for source in candidates:
+                    if usage + needed <= budget:
+                        break
+
+                    if _unlink_if_unused(entries[source]):
+                        usage -= sizes[source]
+                        index.pop(self._key(source), None)
+                        removed.append(self._key(source))
+                        evicted.extend(entries[source])
+
+                if removed:
+                    self._save_index(removed)
+
+            if path is not None:
+                self._reserved[path] = needed
+
+            return evicted
+
+    @contextmanager
+    def reserved(self, path: Path, needed: int):
+        """
+        Evicts room for a download of path, or a file derived from a data file, and reserves it until it is written,
+        then records the access.
+        """
+        self.evict(needed, path=path)
+        try:
+            yield
+        except BaseException:
+            self.release(path)
+            raise
+        self.touch(path)
+
+
+class CachedH5File(h5py.File):
+    """
+    A local h5py File that is recorded as open in the cache until it is closed.
+    """
+
+    def __init__(self, path: Path):
+        self._file_lock = FileLock(path)
+        try:
+            super().__init__(path, 'r')
+        except BaseException:
+            self._file_lock.release()
+            raise
+        self._cache = get_cache()
+        self._cache_path = Path(path)
+        self._cache.opened(self._cache_path)
+
+    def close(self):
+        super().close()
+        if self._cache_path is not None:
+            self._cache.closed(self._cache_path)
+            self._cache_path = None
+            self._file_lock.release()
+
+
+_caches: Dict[Path, LocalCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache() -> LocalCache:
+    """
+    :return: The cache for the current download location
+    """
+    root = get_download_location()
+    with _caches_lock:
+        if root not in _caches:
+            _caches[root] = LocalCache(root)
+        return _caches[root]
+
+
+@atexit.register
+def _flush_caches():
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        try:
+            cache.flush()
+        except OSError:
+            pass
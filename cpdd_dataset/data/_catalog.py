@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+import h5py
+import numpy as np
+import pandas
+
+from ._download import FILE_KINDS, data_files
+from ._location import get_download_location
+from ._manifest import cached_manifest
+from ._transfer import exclusive_lock
+
+_CATALOG_NAME = "catalog.csv"
+_CONFIG_COLUMNS = ("city", "rain", "time", "num_cars", "num_peds", "index")
+_catalog_lock = threading.Lock()
+
+# the group whose datasets are described for each kind, pinhole sides are all the same
+_FRAME_GROUPS = {"cylindrical": "/", "spherical": "/", "pinhole": "/front"}
+
+
+def catalog_file() -> Path:
+    """
+    The catalog in the download location.
+    """
+    return get_download_location() / _CATALOG_NAME
+
+
+def _shape(shape: Sequence[int]) -> str:
+    return "x".join(str(s) for s in shape)
+
+
+def _config_columns(config) -> Dict[str, object]:
+    return {"city": config.city.name, "rain": config.rain.name,
+            "time": "sunset" if config.sunset else "noon", "num_cars": config.num_cars, "num_peds": config.num_peds,
+            "index": config.index}
+
+
+def _pose_stats(f: h5py.File) -> Dict[str, object]:
+    positions = f["abs_pose"][:, 0:3].astype(np.float64)
+    steps = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+    low, high = positions.min(axis=0), positions.max(axis=0)
+
+    return {"pose_frames": len(positions), "distance": float(steps.sum()),
+            "x_min": low[0], "x_max": high[0], "y_min": low[1], "y_max": high[1], "z_min": low[2], "z_max": high[2]}
+
+
+def _frame_stats(kind: str, f: h5py.File) -> Dict[str, object]:
+    group = f[_FRAME_GROUPS[kind]]
+    stats = {f"{kind}_frames": group["rgb"].shape[0]}
+
+    for name in ("rgb", "depth"):
+        ds = group[name]
+        stats[f"{kind}_{name}_shape"] = _shape(ds.shape[1:])
+        stats[f"{kind}_{name}_dtype"] = ds.dtype.name
+        stats[f"{kind}_{name}_chunks"] = _shape(ds.chunks) if ds.chunks is not None else "contiguous"
+        stats[f"{kind}_{name}_compression"] = ds.compression or "none"
+
+    return stats
+
+
+def file_stats(data_file) -> Dict[str, object]:
+    """
+    Gets the catalog columns of a downloaded data file.  Files that aren't downloaded only have their remote size, if
+    it is in the cached manifest.
+    """
+    kind = Path(data_file.filename).stem
+    stats = {}
+
+    manifest = cached_manifest()
+    entry = manifest.get(data_file.manifest_key) if manifest is not None else None
+    if entry is not None:
+        stats[f"{kind}_size"] = entry.size
+
+    if data_file.is_downloaded:
+        stats[f"{kind}_size"] = data_file.download_file.stat().st_size
+        with h5py.File(data_file.download_file, 'r') as f:
+            stats.update(_pose_stats(f) if kind == "pose" else _frame_stats(kind, f))
+
+    return stats
+
+
+def load_catalog(path: Optional[Path] = None) -> pandas.DataFrame:
+    """
+    Loads the catalog, which only needs pandas (and pyarrow for Parquet).  It has a row for each config that has been
+    cataloged, indexed by folder name, with the config's columns (like load_df expects) and, for each kind of data file
+    that is known:
+
+    |  {kind}_size: the file size in bytes
+    |  {kind}_frames: the number of frames
+    |  {kind}_{rgb,depth}_{shape,dtype,chunks,compression}: the layout of each frame dataset, shapes like "1024x2048x3"
+    |  pose_frames, distance, and {x,y,z}_{min,max}: the number of poses, the distance driven in meters, and the
+       bounding box of the run
+
+    :param path: A .csv or .parquet file, defaults to catalog_file()
+    :return: The catalog, which is empty if it doesn't exist
+    """
+    path = Path(path) if path is not None else catalog_file()
+
+    if not path.exists():
+        return pandas.DataFrame(index=pandas.Index([], name="folder"))
+    elif path.suffix == ".parquet":
+        df = pandas.read_parquet(path)
+    else:
+        df = pandas.read_csv(path, index_col="folder")
+
+    # counts of files that aren't cataloged yet are missing, which would make them floats
+    counts = [c for c in df.columns if c.endswith("_frames") or c.endswith("_size")]
+    return df.astype({c: "Int64" for c in counts})
+
+
+def _save(df: pandas.DataFrame, path: Path):
+    # per process, so concurrent updates from different processes don't write the same file
+    part = path.with_name(path.name + f".{os.getpid()}.tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(part)
+    else:
+        df.to_csv(part)
+    os.replace(part, path)
+
+
+def update_catalog(files: Iterable, path: Optional[Path] = None) -> pandas.DataFrame:
+    """
+    Adds or updates the catalog rows of the configs of data files.  This is done whenever a data file is downloaded.
+
+    :param files: The data files to catalog
+    :param path: A .csv or .parquet file, defaults to catalog_file()
+    :return: The updated catalog
+    """
+    path = Path(path) if path is not None else catalog_file()
+
+    rows: Dict[str, Dict[str, object]] = {}
+    for file in files:
+        row = rows.setdefault(file._config.folder_name, _config_columns(file._config))
+        row.update(file_stats(file))
+
+    # other processes may be updating the catalog too, and the last one to save would drop the others' rows
+    with _catalog_lock, exclusive_lock(path.with_suffix(".lock")):
+        df = load_catalog(path)
+        update = pandas.DataFrame.from_dict(rows, orient="index")
+        update.index.name = "folder"
+
+        df = update.combine_first(df) if len(df) else update
+        df = df[list(_CONFIG_COLUMNS) + sorted(c for c in df.columns if c not in _CONFIG_COLUMNS)]
+        _save(df, path)
+
+    return df
+
+
+def build_catalog(configs: Optional[Iterable] = None, kinds: Sequence[str] = FILE_KINDS,
+                  path: Optional[Path] = None) -> pandas.DataFrame:
+    """
+    Catalogs configs, reading the files that are downloaded and taking the sizes of the rest from the cached manifest.
+
+    :param configs: The configs to catalog, defaults to config.all()
+    :param kinds: The kinds of data files to catalog
+    :param path: A .csv or .parquet file, defaults to catalog_file()
+    :return: The updated catalog
+    """
+    if configs is None:
+        from ..config import all
+        configs = all()
+
+    return update_catalog(data_files(configs, kinds), path)
@@ -1,15 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
 import cv2
 import numpy as np
 
-from cpdd_dataset.intrinsics import PinholeIntrinsics
+from cpdd_dataset.intrinsics import PinholeIntrinsics, Pinhole90Intrinsics
+
+
+@lru_cache(maxsize=None)
+def _remap_grid(nearest: bool) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    The source pixel of each 90 degree pixel, as fixed point maps for cv2.remap.  Nearest neighbor maps are rounded
+    to whole pixels and have no interpolation table, since cv2's nearest neighbor remap doesn't round the fractional
+    maps.
+    """
+    src, dst = PinholeIntrinsics(), Pinhole90Intrinsics()
+
+    u = (np.arange(dst.width, dtype=np.float32) - dst.c_x) / dst.f_x * src.f_x + src.c_x
+    v = (np.arange(dst.height, dtype=np.float32) - dst.c_y) / dst.f_y * src.f_y + src.c_y
+    map_x, map_y = np.meshgrid(u, v)
+
+    map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=nearest)
+    return map1, map2 if not nearest else None
+
+
+def _is_nearest(image: np.ndarray, nearest: Optional[bool]) -> bool:
+    if nearest is None:
+        # interpolating depth makes up depths at edges, so it's only done for color
+        return image.dtype != np.uint8
+    return nearest
+
+
+def _interpolation(nearest: bool) -> int:
+    return cv2.INTER_NEAREST if nearest else cv2.INTER_LINEAR
+
+
+def crop_pinhole_to_90(image: np.ndarray, nearest: Optional[bool] = None) -> np.ndarray:
+    """
+    Crops a 100 degree FOV pinhole image to a 90 degree FOV image of the same size.
+
+    :param image: A (768, 768, C) image
+    :param nearest: Use nearest neighbor interpolation instead of bilinear, defaults to True for anything but uint8
+        color, i.e. depth
+    :return: The cropped image
+    """
+    nearest = _is_nearest(image, nearest)
+    map1, map2 = _remap_grid(nearest)
+    return cv2.remap(image, map1, map2, _interpolation(nearest))
+
+
+def crop_pinhole_to_90_batch(images: np.ndarray, out: Optional[np.ndarray] = None, nearest: Optional[bool] = None,
+                             workers: int = 1) -> np.ndarray:
+    """
+    Crops a batch of 100 degree FOV pinhole images to 90 degree FOV images of the same size, like
+    crop_pinhole_to_90.
+
+    :param images: A (N, 768, 768, C) array of color or depth images
+    :param out: An array of the same shape and dtype to write to, allocated if None
+    :param nearest: Use nearest neighbor interpolation instead of bilinear, defaults to True for anything but uint8
+        color, i.e. depth
+    :param workers: The number of threads to crop frames on
+    :return: out
+    """
+    if out is None:
+        out = np.empty_like(images)
+    elif out.shape != images.shape or out.dtype != images.dtype:
+        raise ValueError(f"out is {out.dtype}{out.shape}, expected {images.dtype}{images.shape}")
 
-_new_size = 2 * PinholeIntrinsics().f_x * np.tan(np.pi / 4)
-_scale_factor = 768 / _new_size
+    nearest = _is_nearest(images, nearest)
+    map1, map2 = _remap_grid(nearest)
+    interpolation = _interpolation(nearest)
 
+    def crop(i: int):
+        # cv2 drops single channel dimensions, so depth is written through a view without it
+        dst = out[i, ..., 0] if out.shape[-1] == 1 else out[i]
+        cv2.remap(images[i], map1, map2, interpolation, dst=dst)
 
-def crop_pinhole_to_90(image):
-    image = cv2.resize(image, dsize=(0, 0), fx=_scale_factor, fy=_scale_factor)
-    center = tuple(p // 2 for p in image.shape[:2])
+    if workers <= 1:
+        for i in range(len(images)):
+            crop(i)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(crop, range(len(images))))
 
-    image = cv2.getRectSubPix(image, (768, 768), center)
-    return image
+    return out
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import h5py
+import numpy as np
+
+from ._cache import CachedH5File
+from ._motion import MotionFilter
+from ._side import Side
+
+
+class FilePool:
+    """
+    A bounded pool of open read only h5py files, which closes the least recently used file when it is full.  After a
+    fork, the files opened by the parent are dropped and reopened in the child, since h5py handles can't be shared
+    between processes.
+    """
+
+    def __init__(self, max_open: int = 16):
+        self.max_open = max_open
+        self._files: OrderedDict = OrderedDict()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> h5py.File:
+        with self._lock:
+            if self._pid != os.getpid():
+                # don't close the parent's handles, they are still in use there
+                self._files = OrderedDict()
+                self._pid = os.getpid()
+
+            if path in self._files:
+                self._files.move_to_end(path)
+                return self._files[path]
+
+            while len(self._files) >= self.max_open:
+                self._files.popitem(last=False)[1].close()
+
+            file = CachedH5File(path)
+            self._files[path] = file
+            return file
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for file in self._files.values():
+                    file.close()
+            self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __reduce__(self):
+        # open files can't be pickled, the copy opens its own
+        return FilePool, (self.max_open,)
+
+
+class FrameDataset:
+    """
+    Random access to the frames of many runs, by a global frame index.  Frame counts are read once up front, and files
+    are kept open in a bounded pool, so random access doesn't open a file per frame.  It can be pickled (i.e. sent to
+    DataLoader workers), and each process opens its own files.
+    """
+
+    def __init__(self, configs: Sequence, modality: Union[str, Side] = "cylindrical", depth: bool = True,
+                 max_open: int = 16, motion: Optional[MotionFilter] = None):
+        """
+        :param configs: The runs to read, which must be downloaded
+        :param modality: "cylindrical", "spherical", or a Side for that pinhole side
+        :param depth: Whether to read depth as well as color
+        :param max_open: The maximum number of files to keep open
+        :param motion: Only index the frames this filter keeps, which needs the runs' pose files
+        """
+        self.configs = list(configs)
+        self.modality = modality
+        self.depth = depth
+        self.motion = motion
+        self._pool = FilePool(max_open)
+
+        self._sources: List[Tuple[Path, str]] = [self._source(c) for c in self.configs]
+
+        # the frames of each run, or None for all of them
+        self._frames: List[Optional[np.ndarray]] = [motion.frames(c) if motion is not None else None
+                                                    for c in self.configs]
+
+        lengths = [len(f) if f is not None else self._group(i)["rgb"].shape[0] for i, f in enumerate(self._frames)]
+        self._offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+    def _source(self, config) -> Tuple[Path, str]:
+        if isinstance(self.modality, Side):
+            side = config.pinhole_data[self.modality]
+            return side.local_file, side.side
+        elif self.modality == "cylindrical":
+            return config.cylindrical_data.download_file_if_exists, "/"
+        elif self.modality == "spherical":
+            return config.spherical_data.download_file_if_exists, "/"
+        else:
+            raise ValueError(f"{self.modality} is not a valid modality, expected cylindrical, spherical, or a Side")
+
+    def _group(self, i: int) -> h5py.Group:
+        path, group = self._sources[i]
+        return self._pool.get(path)[group]
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self._offsets)
+
+    def locate(self, index: int) -> Tuple[object, int]:
+        """
+        :return: The config and the frame within it of a global frame index
+        """
+        i, frame = self._locate(index)
+        return self.configs[i], frame
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} out of range for {len(self)} frames")
+
+        i = int(np.searchsorted(self._offsets, index, side='right')) - 1
+        frame = int(index - self._offsets[i])
+        return i, int(self._frames[i][frame]) if self._frames[i] is not None else frame
+
+    def __getitem__(self, index: int) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """
+        :return: (color, depth) for the frame, or just color if depth is False
+        """
+        i, frame = self._locate(index)
+        group = self._group(i)
+
+        if self.depth:
+            return group["rgb"][frame], group["depth"][frame]
+        return group["rgb"][frame]
+
+    def close(self):
+        self._pool.close()
@@ -0,0 +1,94 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+# raw depth is uint16 decimeters
+METERS_PER_UNIT = np.float32(0.1)
+# CARLA's far plane, which is where the sky ends up
+FAR_DEPTH = 1000.0
+DEPTH_FORMATS = ("raw", "meters", "inverse")
+
+
+def _raw(meters: float) -> int:
+    return int(round(meters / METERS_PER_UNIT))
+
+
+def _out(raw: np.ndarray, out: Optional[np.ndarray], dtype) -> np.ndarray:
+    if out is None:
+        return np.empty(raw.shape, dtype=dtype)
+    if out.shape != raw.shape:
+        raise ValueError(f"out has shape {out.shape}, expected {raw.shape}")
+    return out
+
+
+def depth_to_meters(raw: np.ndarray, out: Optional[np.ndarray] = None, max_depth: Optional[float] = FAR_DEPTH) \
+        -> np.ndarray:
+    """
+    Converts raw depth to meters.
+
+    :param raw: Raw uint16 depth, in decimeters, of any shape
+    :param out: A float32 array of the same shape to write to, allocated if None
+    :param max_depth: Clip depth to this many meters, or None to not clip
+    :return: out
+    """
+    out = _out(raw, out, np.float32)
+    np.multiply(raw, METERS_PER_UNIT, out=out, dtype=np.float32)
+
+    if max_depth is not None:
+        np.minimum(out, np.float32(max_depth), out=out)
+
+    return out
+
+
+def depth_to_inverse(raw: np.ndarray, out: Optional[np.ndarray] = None, min_depth: float = 0.1,
+                     max_depth: float = FAR_DEPTH) -> np.ndarray:
+    """
+    Converts raw depth to inverse depth (disparity up to scale), in 1/meters.  Depth is clipped to
+    [min_depth, max_depth] first, so 0 depth doesn't become infinite and the sky becomes 1 / max_depth.
+
+    :param raw: Raw uint16 depth, in decimeters, of any shape
+    :param out: A float32 array of the same shape to write to, allocated if None
+    :param min_depth: The minimum depth, in meters
+    :param max_depth: The maximum depth, in meters
+    :return: out
+    """
+    out = _out(raw, out, np.float32)
+
+    with np.errstate(divide="ignore"):
+        np.divide(np.float32(1 / METERS_PER_UNIT), raw, out=out, dtype=np.float32)
+
+    np.clip(out, np.float32(1 / max_depth), np.float32(1 / min_depth), out=out)
+    return out
+
+
+def depth_valid_mask(raw: np.ndarray, out: Optional[np.ndarray] = None, min_depth: float = 0.0,
+                     max_depth: float = FAR_DEPTH) -> np.ndarray:
+    """
+    Finds the pixels with a real depth: more than min_depth, and less than max_depth (the far plane, i.e. the sky).
+
+    :param raw: Raw uint16 depth, in decimeters, of any shape
+    :param out: A bool array of the same shape to write to, allocated if None
+    :param min_depth: Depths at or below this many meters are invalid
+    :param max_depth: Depths at or above this many meters are invalid
+    :return: out
+    """
+    out = _out(raw, out, np.bool_)
+    np.greater(raw, _raw(min_depth), out=out)
+    np.logical_and(out, raw < _raw(max_depth), out=out)
+    return out
+
+
+def depth_decoder(depth_format: str, **kwargs) -> Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+    """
+    :param depth_format: "raw", "meters", or "inverse"
+    :param kwargs: Passed to the conversion function
+    :return: A function converting raw depth into an out array, or None for raw
+    """
+    if depth_format == "raw":
+        return None
+    elif depth_format == "meters":
+        return lambda raw, out: depth_to_meters(raw, out, **kwargs)
+    elif depth_format == "inverse":
+        return lambda raw, out: depth_to_inverse(raw, out, **kwargs)
+    else:
+        raise ValueError(f"{depth_format} is not a valid depth format, expected one of {DEPTH_FORMATS}")
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from ._manifest import get_manifest
+from ._s3 import get_filesystem
+
+FILE_KINDS = ("pose", "cylindrical", "spherical", "pinhole")
+
+
+class DownloadError(IOError):
+    def __init__(self, failed: List[Tuple[object, BaseException]]):
+        self.failed = failed
+        super().__init__(f"{len(failed)} file(s) failed to download, first: {failed[0][0]}: {failed[0][1]!r}")
+
+
+@dataclass
+class DownloadProgress:
+    total_files: int
+    total_bytes: int = 0
+    finished_files: int = 0
+    failed_files: int = 0
+    downloaded_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: Average throughput so far, in bytes per second
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.downloaded_bytes / self.elapsed
+
+    def __str__(self):
+        return f"{self.finished_files + self.failed_files}/{self.total_files} files " \
+               f"({self.failed_files} failed), {self.downloaded_bytes / 2 ** 20:.1f}/" \
+               f"{self.total_bytes / 2 ** 20:.1f} MiB at " \
+               f"{self.throughput / 2 ** 20:.1f} MiB/s"
+
+
+@dataclass
+class DownloadResult:
+    downloaded: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    failed: List[Tuple[object, BaseException]] = field(default_factory=list)
+    downloaded_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: Average throughput, in bytes per second
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.downloaded_bytes / self.elapsed
+
+    def raise_for_failures(self):
+        if self.failed:
+            raise DownloadError(self.failed)
+
+
+def data_files(configs: Iterable, kinds: Sequence[str] = FILE_KINDS) -> list:
+    """
+    Gets the data files of each kind for each config.
+
+    :param configs: The configs to get files for
+    :param kinds: Any of "pose", "cylindrical", "spherical", and "pinhole"
+    :return: A list of DataFiles, config-major
+    """
+    for kind in kinds:
+        if kind not in FILE_KINDS:
+            raise ValueError(f"{kind} is not a valid file kind, expected one of {FILE_KINDS}")
+
+    return [getattr(config, f"{kind}_data") for config in configs for kind in kinds]
+
+
+def download_many(configs: Iterable, kinds: Sequence[str] = FILE_KINDS, force: bool = False, workers: int = 8,
+                  retries: int = 3, retry_delay: float = 1.0,
+                  progress: Optional[Callable[[DownloadProgress], None]] = None) -> DownloadResult:
+    """
+    Downloads the data files of many configs at once, using a bounded thread pool and a single shared S3 client.
+    Files that are already downloaded are skipped, and sizes are taken from the remote manifest.  A file that fails
+    is retried, and if it still fails it is recorded in the result instead of aborting the batch.
+
+    :param configs: The configs to download
+    :param kinds: The kinds of data files to download, any of "pose", "cylindrical", "spherical", and "pinhole"
+    :param force: Re-download files that are already downloaded
+    :param workers: The maximum number of concurrent transfers
+    :param retries: How many times to retry a failed file
+    :param retry_delay: Seconds to wait before the first retry, doubled for each following retry
+    :param progress: Called with the aggregate progress as each chunk of a file is written, and every time a file
+        finishes or fails.  Calls are made one at a time, from the transfer threads as well as this one.
+    :return: The downloaded, skipped, and failed files, and the transfer statistics
+    """
+    files = data_files(configs, kinds)
+    fs = get_filesystem()
+    manifest = get_manifest()
+
+    downloaded = [False] * len(files) if force else [file.is_downloaded for file in files]
+    result = DownloadResult(skipped=[file for file, d in zip(files, downloaded) if d])
+    files = [file for file, d in zip(files, downloaded) if not d]
+
+    state = DownloadProgress(len(files), sum(manifest.get(f.manifest_key).size for f in files
+                                             if f.manifest_key in manifest))
+    start = time.monotonic()
+    lock = threading.Lock()
+
+    def update(downloaded_bytes: int = 0, finished_files: int = 0, failed_files: int = 0):
+        with lock:
+            state.downloaded_bytes += downloaded_bytes
+            state.finished_files += finished_files
+            state.failed_files += failed_files
+            state.elapsed = time.monotonic() - start
+
+            if progress is not None:
+                progress(state)
+
+    def fetch(file):
+        for attempt in range(retries + 1):
+            try:
+                # retries resume the partial download instead of starting over
+                file._download(force and attempt == 0, fs=fs, progress=update)
+                return
+            except Exception:
+                if attempt == retries:
+                    raise
+                time.sleep(retry_delay * 2 ** attempt)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, file): file for file in files}
+
+        for future in as_completed(futures):
+            file = futures[future]
+
+            try:
+                future.result()
+                result.downloaded.append(file)
+                update(finished_files=1)
+            except Exception as e:
+                result.failed.append((file, e))
+                update(failed_files=1)
+
+    result.downloaded_bytes = state.downloaded_bytes
+    result.elapsed = time.monotonic() - start
+    return result
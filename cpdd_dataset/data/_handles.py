@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, Dict, Hashable
+
+import h5py
+
+
+class SharedFile:
+    """
+    An open h5py file shared by everything in the process that opens the same key, with the groups and datasets gotten
+    from it cached.  Each open_shared is a reference, released by close (or leaving a with block), and the file is
+    closed when the last reference is released.
+    """
+
+    def __init__(self, key: Hashable, file: h5py.File):
+        self.key = key
+        self.file = file
+        self._refs = 0
+        self._objects: Dict[str, object] = {}
+
+    @property
+    def refs(self) -> int:
+        return self._refs
+
+    def __getitem__(self, name: str):
+        if name not in self._objects:
+            self._objects[name] = self.file[name]
+        return self._objects[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._objects or name in self.file
+
+    def close(self):
+        _release(self)
+
+    def __enter__(self) -> SharedFile:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_registry: Dict[Hashable, SharedFile] = {}
+_registry_pid = os.getpid()
+_registry_lock = threading.RLock()
+
+
+def _check_fork():
+    global _registry, _registry_pid
+    if _registry_pid != os.getpid():
+        # the parent's handles can't be used here, and aren't ours to close
+        _registry = {}
+        _registry_pid = os.getpid()
+
+
+def open_shared(key: Hashable, opener: Callable[[], h5py.File]) -> SharedFile:
+    """
+    Gets a reference to the shared file for key, opening it with opener if it isn't already open.
+    """
+    with _registry_lock:
+        _check_fork()
+
+        shared = _registry.get(key)
+        if shared is None:
+            shared = SharedFile(key, opener())
+            _registry[key] = shared
+
+        shared._refs += 1
+        return shared
+
+
+def _release(shared: SharedFile):
+    with _registry_lock:
+        _check_fork()
+
+        if shared._refs <= 0:
+            return
+
+        shared._refs -= 1
+        if shared._refs == 0:
+            if _registry.get(shared.key) is shared:
+                del _registry[shared.key]
+            shared._objects.clear()
+            shared.file.close()
+
+
+def open_files() -> int:
+    """
+    :return: The number of shared files open in this process
+    """
+    with _registry_lock:
+        _check_fork()
+        return len(_registry)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import random
+import traceback
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+
+from ._batches import batch_ranges, chunk_frames
+from ._cache import FileLock
+from ._run_data import PinholeDataFile, PinholeDataFileSide
+from ._side import Side
+
+
+def _sources(data_file) -> List[Tuple[Path, str]]:
+    """
+    :return: The (file, group) pairs to read frames from for a data file, pinhole data files have one per side
+    """
+    if isinstance(data_file, PinholeDataFile):
+        return [(data_file.download_file_if_exists, side.name.lower()) for side in Side]
+    elif isinstance(data_file, PinholeDataFileSide):
+        return [(data_file.local_file, data_file.side)]
+    else:
+        return [(data_file.download_file_if_exists, "/")]
+
+
+def _views(buffers, shapes, dtypes) -> List[np.ndarray]:
+    return [np.frombuffer(buf, dtype=dtype).reshape(shape) for buf, shape, dtype in zip(buffers, shapes, dtypes)]
+
+
+def _worker(buffers, shapes, dtypes, names, sources, epoch, tasks, free, ready):
+    slots = _views(buffers, shapes, dtypes)
+    files: Dict[Path, h5py.File] = {}
+    # keeps the files from being evicted by other processes while they are open
+    locks: List[FileLock] = []
+
+    try:
+        while True:
+            slot = free.get()
+            task = tasks.get()
+
+            if task is None:
+                free.put(slot)
+                return
+
+            task_epoch, task_id, source, start, end = task
+
+            if task_epoch != epoch.value:
+                free.put(slot)
+                ready.put((task_epoch, task_id, None, 0, None))
+                continue
+
+            try:
+                path, group = sources[source]
+                if path not in files:
+                    locks.append(FileLock(path))
+                    files[path] = h5py.File(path, 'r')
+
+                for name, out in zip(names, slots):
+                    files[path][group][name].read_direct(out[slot], np.s_[start:end], np.s_[0:end - start])
+
+                ready.put((task_epoch, task_id, slot, end - start, None))
+            except Exception:
+                ready.put((task_epoch, task_id, slot, 0, traceback.format_exc()))
+    finally:
+        for f in files.values():
+            f.close()
+        for lock in locks:
+            lock.release()
+
+
+class ParallelLoader:
+    """
+    Reads batches of frames on worker processes, which each open their own files.  Workers decode batches straight
+    into a ring of shared memory slots, and the batches are yielded as numpy views of their slot, so nothing is copied
+    or pickled.  A slot is reused once the next batch is requested, so copy a batch if it needs to be kept.
+    """
+
+    def __init__(self, data_files: Sequence, batch_size: int, workers: int = 4, slots: Optional[int] = None,
+                 depth: bool = True, shuffle: bool = False, seed: int = 0, ordered: bool = True,
+                 start_method: str = "spawn"):
+        """
+        :param data_files: Downloaded cylindrical, spherical, or pinhole data files (or pinhole sides).  Pinhole files
+            are read one side at a time.  Every file must have the same frame shape.
+        :param batch_size: The number of frames in each batch, rounded up to a whole number of chunks.  Batches don't
+            span files, so the last batch of each file may be shorter.
+        :param workers: The number of worker processes
+        :param slots: The number of batches in the shared memory ring, defaults to twice the number of workers
+        :param depth: Whether to read depth as well as color
+        :param shuffle: Shuffle the order of the batches every epoch
+        :param seed: The seed used for shuffling, combined with the epoch
+        :param ordered: Yield batches in order, instead of as soon as they are ready
+        :param start_method: The multiprocessing start method for the workers
+        """
+        self._sources = [s for f in data_files for s in _sources(f)]
+        self.workers = workers
+        self.shuffle = shuffle
+        self.seed = seed
+        self.ordered = ordered
+        self._names = ["rgb", "depth"] if depth else ["rgb"]
+        self._ctx = multiprocessing.get_context(start_method)
+        self._processes = []
+        self._epoch = 0
+
+        self._ranges = []
+        frame_shapes = set()
+        batch_frames = 0
+        for i, (path, group) in enumerate(self._sources):
+            with h5py.File(path, 'r') as f:
+                datasets = [f[group][n] for n in self._names]
+                frame_shapes.add(tuple((ds.shape[1:], ds.dtype.str) for ds in datasets))
+                ranges = batch_ranges(0, datasets[0].shape[0], batch_size, chunk_frames(datasets))
+                self._ranges.extend((i, s, e) for s, e in ranges)
+                batch_frames = max([batch_frames] + [e - s for s, e in ranges])
+
+        if len(frame_shapes) != 1:
+            raise ValueError(f"Data files must all have the same frame shapes, got {frame_shapes}")
+
+        self.slots = slots if slots is not None else 2 * workers
+        if self.slots < workers:
+            raise ValueError(f"Need at least as many slots ({self.slots}) as workers ({workers})")
+
+        frame_shape = frame_shapes.pop()
+        self._shapes = [(self.slots, batch_frames) + shape for shape, _ in frame_shape]
+        self._dtypes = [np.dtype(dtype) for _, dtype in frame_shape]
+        self._buffers = [self._ctx.RawArray('b', int(np.prod(shape)) * dtype.itemsize)
+                         for shape, dtype in zip(self._shapes, self._dtypes)]
+        self._slots = _views(self._buffers, self._shapes, self._dtypes)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def _start(self):
+        if self._processes:
+            return
+
+        self._epoch_value = self._ctx.Value('l', 0)
+        self._tasks = self._ctx.Queue()
+        self._free = self._ctx.Queue()
+        self._ready = self._ctx.Queue()
+
+        for slot in range(self.slots):
+            self._free.put(slot)
+
+        for _ in range(self.workers):
+            p = self._ctx.Process(target=_worker, daemon=True,
+                                  args=(self._buffers, self._shapes, self._dtypes, self._names, self._sources,
+                                        self._epoch_value, self._tasks, self._free, self._ready))
+            p.start()
+            self._processes.append(p)
+
+    def _get(self):
+        while True:
+            try:
+                return self._ready.get(timeout=1)
+            except queue.Empty:
+                dead = [p for p in self._processes if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Loader worker exited with code {dead[0].exitcode}")
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """
+        :return: An iterator of (color, depth) batches, depth is None if it isn't being read
+        """
+        self._start()
+
+        epoch = self._epoch
+        self._epoch += 1
+        self._epoch_value.value = epoch
+
+        order = list(range(len(self._ranges)))
+        if self.shuffle:
+            random.Random(self.seed * 1000003 + epoch).shuffle(order)
+
+        for task_id, i in enumerate(order):
+            self._tasks.put((epoch, task_id) + self._ranges[i])
+
+        outstanding = len(order)
+        waiting = {}
+        held = None
+
+        try:
+            for next_id in range(len(order)):
+                if self.ordered:
+                    while next_id not in waiting:
+                        result = self._get()
+                        waiting[result[1]] = result
+                    result = waiting.pop(next_id)
+                else:
+                    result = self._get()
+
+                outstanding -= 1
+                _, _, slot, n, error = result
+
+                if held is not None:
+                    self._free.put(held)
+                held = slot
+
+                if error is not None:
+                    raise RuntimeError(f"Loader worker failed:\n{error}")
+
+                yield tuple(s[slot, :n] for s in self._slots) + ((None,) if len(self._slots) == 1 else ())
+        finally:
+            # workers skip the rest of an abandoned epoch's tasks
+            self._epoch_value.value = -1
+            if held is not None:
+                self._free.put(held)
+            for _, _, slot, _, _ in waiting.values():
+                if slot is not None:
+                    self._free.put(slot)
+            outstanding -= len(waiting)
+
+            for _ in range(outstanding):
+                _, _, slot, _, _ = self._get()
+                if slot is not None:
+                    self._free.put(slot)
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for p in self._processes:
+            p.join()
+        self._processes = []
+
+    def __enter__(self) -> ParallelLoader:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
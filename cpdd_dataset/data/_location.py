@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 import os
 
 
@@ -16,3 +16,30 @@ def set_download_location(new_loc: Union[str, Path]):
 
     new_loc.mkdir(parents=True, exist_ok=True)
     os.environ["CARLA_DOWNLOAD_LOCATION"] = str(new_loc)
+
+
+_SIZE_SUFFIXES = {"K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30, "T": 2 ** 40}
+
+
+def get_cache_budget() -> Optional[int]:
+    """
+    :return: The maximum number of bytes of data files to keep in the download location, or None if unlimited
+    """
+    budget = os.getenv("CARLA_CACHE_BUDGET")
+    if not budget:
+        return None
+
+    budget = budget.strip().upper().rstrip("B")
+    if budget[-1:] in _SIZE_SUFFIXES:
+        return int(float(budget[:-1]) * _SIZE_SUFFIXES[budget[-1]])
+    return int(budget)
+
+
+def set_cache_budget(budget: Union[int, str, None]):
+    """
+    :param budget: A number of bytes, a size like "500G", or None for unlimited
+    """
+    if budget is None:
+        os.environ.pop("CARLA_CACHE_BUDGET", None)
+    else:
+        os.environ["CARLA_CACHE_BUDGET"] = str(budget)
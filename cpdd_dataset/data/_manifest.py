@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from ._location import get_download_location
+from ._s3 import REMOTE_ROOT, get_filesystem
+
+DEFAULT_TTL = 24 * 60 * 60
+_MANIFEST_NAME = ".manifest.json"
+
+
+@dataclass(frozen=True)
+class RemoteEntry:
+    size: int
+    etag: str
+
+
+class Manifest:
+    """
+    The size and ETag of every remote file, keyed by "{folder_name}/{filename}".
+    """
+
+    def __init__(self, entries: Dict[str, RemoteEntry], created: float):
+        self.entries = entries
+        self.created = created
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[RemoteEntry]:
+        return self.entries.get(key)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created
+
+    @staticmethod
+    def build(fs=None) -> Manifest:
+        """
+        Lists the whole remote dataset in one pass.
+        """
+        if fs is None:
+            fs = get_filesystem()
+
+        prefix = REMOTE_ROOT[len("s3://"):]
+        entries = {}
+
+        for path, info in fs.find(REMOTE_ROOT, detail=True).items():
+            path = path[len("s3://"):] if path.startswith("s3://") else path
+            if not path.startswith(prefix) or info.get("type", "file") != "file":
+                continue
+            entries[path[len(prefix):]] = RemoteEntry(int(info["size"]), (info.get("ETag") or "").strip('"'))
+
+        return Manifest(entries, time.time())
+
+    def save(self, file: Path):
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_name(file.name + f".{os.getpid()}.tmp")
+
+        with open(tmp, "w") as f:
+            json.dump({"created": self.created,
+                       "entries": {k: [e.size, e.etag] for k, e in self.entries.items()}}, f)
+
+        os.replace(tmp, file)
+
+    @staticmethod
+    def load(file: Path) -> Manifest:
+        with open(file) as f:
+            data = json.load(f)
+        return Manifest({k: RemoteEntry(size, etag) for k, (size, etag) in data["entries"].items()}, data["created"])
+
+
+_manifests: Dict[Path, Manifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def cached_manifest() -> Optional[Manifest]:
+    """
+    :return: The manifest from memory or the download location regardless of its age, or None if there isn't one.
+        Never makes a remote request.
+    """
+    root = get_download_location()
+    with _manifests_lock:
+        if root not in _manifests:
+            try:
+                _manifests[root] = Manifest.load(root / _MANIFEST_NAME)
+            except (OSError, ValueError, KeyError):
+                return None
+        return _manifests[root]
+
+
+def get_manifest(ttl: float = DEFAULT_TTL, refresh: bool = False) -> Manifest:
+    """
+    Gets the manifest of the remote dataset, which is cached in the download location.
+
+    :param ttl: The maximum age of the cached manifest in seconds, after which it is rebuilt
+    :param refresh: Rebuild the manifest even if the cached one is fresh
+    :return: The manifest
+    """
+    manifest = None if refresh else cached_manifest()
+
+    if manifest is None or manifest.age > ttl:
+        root = get_download_location()
+        manifest = Manifest.build()
+        manifest.save(root / _MANIFEST_NAME)
+
+        with _manifests_lock:
+            _manifests[root] = manifest
+
+    return manifest
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ._transfer import temp_file
+
+# bumped when masks change, so masks cached by older versions aren't used
+_MASK_VERSION = 2
+
+_masks: Dict[Tuple[str, str], np.ndarray] = {}
+_masks_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class MotionFilter:
+    """
+    Selects the frames of a run where the car moved, from its poses.  Frame 0 is always kept.
+
+    :param min_translation: Skip frames that moved less than this many meters since the previous frame, unless they
+        turned at least min_rotation
+    :param min_rotation: Skip frames that turned less than this many degrees since the previous frame, unless they
+        moved at least min_translation
+    :param spacing: Keep about one frame per this many meters driven, or None to not subsample.  With thresholds too,
+        it keeps the first frame that passes them in each spacing meters, so a stretch where none pass keeps none.
+    """
+    min_translation: float = 0.0
+    min_rotation: float = 0.0
+    spacing: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the filter in cache file names.
+        """
+        return f"t{self.min_translation:g}_r{self.min_rotation:g}_s{self.spacing or 0:g}"
+
+    def mask(self, relative_pose: np.ndarray, absolute_pose: np.ndarray) -> np.ndarray:
+        """
+        :param relative_pose: A (frames, 6) array, like PoseData.relative_pose[:]
+        :param absolute_pose: A (frames, 6) array, like PoseData.absolute_pose[:]
+        :return: A (frames,) bool array of the frames to keep
+        """
+        frames = len(relative_pose)
+        if frames == 0:
+            return np.zeros(0, dtype=bool)
+
+        # the translation is the same in any frame, so it's taken from the relative pose
+        steps = np.linalg.norm(relative_pose[:, 0:3].astype(np.float64), axis=1)
+        steps[0] = 0
+
+        headings = absolute_pose[:, 3:6].astype(np.float64)
+        headings /= np.linalg.norm(headings, axis=1, keepdims=True)
+        cosines = np.clip(np.einsum("ij,ij->i", headings[1:], headings[:-1]), -1, 1)
+        turns = np.concatenate([[0], np.degrees(np.arccos(cosines))])
+
+        keep = np.ones(frames, dtype=bool)
+        if self.min_translation > 0 or self.min_rotation > 0:
+            moved = steps >= self.min_translation if self.min_translation > 0 else np.zeros(frames, dtype=bool)
+            turned = turns >= self.min_rotation if self.min_rotation > 0 else np.zeros(frames, dtype=bool)
+            keep &= moved | turned
+        keep[0] = True
+
+        if self.spacing is not None:
+            # the first frame that passed the thresholds in each spacing meters driven
+            passed = np.flatnonzero(keep)
+            buckets = np.floor(np.cumsum(steps) / self.spacing)[passed]
+            keep[passed[1:][np.diff(buckets) == 0]] = False
+
+        return keep
+
+    def cache_file(self, config) -> Path:
+        return config.download_location / f"keep.v{_MASK_VERSION}.{self.key}.npy"
+
+    def keep_mask(self, config) -> np.ndarray:
+        """
+        Gets the mask of a run, which is cached in memory and next to its pose file.  The cache is rebuilt if the pose
+        file is newer.
+
+        :param config: A config whose pose file is downloaded
+        :return: A (frames,) bool array of the frames to keep
+        """
+        key = (config.folder_name, self.key)
+        with _masks_lock:
+            if key in _masks:
+                return _masks[key]
+
+        pose_file = config.pose_data.download_file_if_exists
+        file = self.cache_file(config)
+
+        if file.exists() and file.stat().st_mtime >= pose_file.stat().st_mtime:
+            mask = np.load(file)
+        else:
+            with config.pose_data as pose:
+                mask = self.mask(pose.relative_pose[:], pose.absolute_pose[:])
+
+            part = temp_file(file)
+            with open(part, "wb") as f:
+                np.save(f, mask)
+            os.replace(part, file)
+
+        mask.setflags(write=False)
+        with _masks_lock:
+            return _masks.setdefault(key, mask)
+
+    def frames(self, config) -> np.ndarray:
+        """
+        :return: The indices of the frames of a run to keep, for the frames argument of Data.batches
+        """
+        return np.flatnonzero(self.keep_mask(config))
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+POSE_DTYPE = np.dtype([("config", np.uint32), ("frame", np.uint32), ("xyz", np.float32, 3),
+                       ("heading", np.float32, 3)])
+
+_indices: Dict[Tuple[object, FrozenSet], PoseIndex] = {}
+_indices_lock = threading.Lock()
+
+
+class FrameRef(NamedTuple):
+    config: object
+    frame: int
+    distance: float
+
+
+def _load(config) -> np.ndarray:
+    with config.pose_data as pose:
+        return pose.absolute_pose[:]
+
+
+class PoseIndex:
+    """
+    The absolute poses of many runs in one array, with a grid index over x and y for finding the frames near a point.
+    Distances are 3D, in meters.
+    """
+
+    def __init__(self, configs: Sequence, poses: np.ndarray, cell_size: float = 10.0):
+        """
+        :param configs: The configs that the config field of poses indexes into
+        :param poses: A POSE_DTYPE array of every frame
+        :param cell_size: The size of the grid cells, in meters
+        """
+        self.configs = list(configs)
+        self.cell_size = cell_size
+
+        cells = np.floor(poses["xyz"][:, 0:2] / cell_size).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+
+        self.poses = poses[order]
+        self._cells = cells[order]
+        self._keys, self._starts = np.unique(self._cells, axis=0, return_index=True)
+        self._ends = np.append(self._starts[1:], len(self.poses))
+        self._grid: Dict[Tuple[int, int], Tuple[int, int]] = {(int(x), int(y)): (int(s), int(e))
+                                                              for (x, y), s, e in zip(self._keys, self._starts,
+                                                                                      self._ends)}
+        self._config_ids = {c: i for i, c in enumerate(self.configs)}
+
+    def __len__(self):
+        return len(self.poses)
+
+    @staticmethod
+    def build(configs: Iterable, cell_size: float = 10.0, workers: int = 8) -> PoseIndex:
+        """
+        Loads the pose files of configs in parallel and indexes them.
+
+        :param configs: Configs whose pose files are downloaded
+        :param cell_size: The size of the grid cells, in meters
+        :param workers: The number of threads to load pose files on
+        """
+        configs = list(dict.fromkeys(configs))
+        if len(configs) > np.iinfo(np.uint32).max:
+            raise ValueError(f"Too many configs to index: {len(configs)}")
+
+        with ThreadPoolExecutor(workers) as pool:
+            runs = list(pool.map(_load, configs))
+
+        poses = np.empty(sum(len(r) for r in runs), dtype=POSE_DTYPE)
+        start = 0
+        for i, run in enumerate(runs):
+            block = poses[start:start + len(run)]
+            block["config"] = i
+            block["frame"] = np.arange(len(run))
+            block["xyz"] = run[:, 0:3]
+            block["heading"] = run[:, 3:6]
+            start += len(run)
+
+        return PoseIndex(configs, poses, cell_size)
+
+    @staticmethod
+    def for_city(city, configs: Optional[Iterable] = None, cell_size: float = 10.0, workers: int = 8) -> PoseIndex:
+        """
+        Gets the index of a city's runs, which is cached for the same configs.  Runs in different cities share
+        coordinates, so they shouldn't be indexed together.
+
+        :param city: The City
+        :param configs: The configs to index, only those in city are used.  Defaults to every config of city whose
+            pose file is downloaded.
+        :param cell_size: The size of the grid cells, in meters
+        :param workers: The number of threads to load pose files on
+        """
+        if configs is None:
+            from ..config import all
+            configs = [c for c in all() if c.pose_data.is_downloaded]
+
+        configs = frozenset(c for c in configs if c.city == city)
+        key = (city, configs, cell_size)
+
+        with _indices_lock:
+            if key in _indices:
+                return _indices[key]
+
+        index = PoseIndex.build(sorted(configs), cell_size, workers)
+
+        with _indices_lock:
+            return _indices.setdefault(key, index)
+
+    def _refs(self, rows: np.ndarray, distances: np.ndarray) -> List[FrameRef]:
+        order = np.argsort(distances, kind="stable")
+        return [FrameRef(self.configs[self.poses["config"][rows[i]]], int(self.poses["frame"][rows[i]]),
+                         float(distances[i])) for i in order]
+
+    def _candidates(self, xy: np.ndarray, rings: int) -> np.ndarray:
+        cx, cy = (int(c) for c in np.floor(xy / self.cell_size))
+
+        if (2 * rings + 1) ** 2 <= len(self._grid):
+            spans = [self._grid[(x, y)] for x in range(cx - rings, cx + rings + 1)
+                     for y in range(cy - rings, cy + rings + 1) if (x, y) in self._grid]
+        else:
+            # more cells in the rings than are occupied, so check the occupied ones instead
+            near = np.abs(self._keys - [cx, cy]).max(axis=1) <= rings
+            spans = list(zip(self._starts[near], self._ends[near]))
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in spans])
+
+    def _distances(self, point: np.ndarray, rows: np.ndarray, exclude) -> Tuple[np.ndarray, np.ndarray]:
+        if exclude is not None and exclude in self._config_ids:
+            rows = rows[self.poses["config"][rows] != self._config_ids[exclude]]
+        return rows, np.linalg.norm(self.poses["xyz"][rows] - point, axis=1)
+
+    def radius(self, point: Sequence[float], radius: float, exclude=None) -> List[FrameRef]:
+        """
+        Finds the frames within radius of a point.
+
+        :param point: An [X, Y, Z] position, like absolute_pose[i, 0:3]
+        :param radius: The distance in meters
+        :param exclude: A config whose frames are skipped, like the run the point is from
+        :return: The frames, nearest first
+        """
+        point = np.asarray(point, dtype=np.float32)[0:3]
+        rows = self._candidates(point[0:2], int(np.ceil(radius / self.cell_size)))
+        rows, distances = self._distances(point, rows, exclude)
+
+        near = distances <= radius
+        return self._refs(rows[near], distances[near])
+
+    def knn(self, point: Sequence[float], k: int, exclude=None) -> List[FrameRef]:
+        """
+        Finds the k frames nearest to a point.
+
+        :param point: An [X, Y, Z] position, like absolute_pose[i, 0:3]
+        :param k: The number of frames
+        :param exclude: A config whose frames are skipped, like the run the point is from
+        :return: The frames, nearest first
+        """
+        point = np.asarray(point, dtype=np.float32)[0:3]
+        total = len(self) - (np.count_nonzero(self.poses["config"] == self._config_ids[exclude])
+                             if exclude in self._config_ids else 0)
+        k = min(k, total)
+        if k <= 0:
+            return []
+
+        rings = 0
+        while True:
+            rows, distances = self._distances(point, self._candidates(point[0:2], rings), exclude)
+
+            # every frame outside of the searched rings is at least this far away
+            if len(rows) >= k:
+                nearest = np.argpartition(distances, k - 1)[:k]
+                if distances[nearest].max() <= rings * self.cell_size or len(rows) == total:
+                    return self._refs(rows[nearest], distances[nearest])
+
+            rings = max(1, 2 * rings)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+import posixpath
+from pathlib import Path
+from typing import List
+
+import cv2
+import h5py
+import numpy as np
+
+from ._batches import iter_batches
+from ._cache import get_cache
+from ._transfer import temp_file
+
+DEPTH_REDUCTIONS = ("min", "nearest")
+
+
+def level_group(level: int, name: str) -> str:
+    """
+    :return: The group in a pyramid file holding a level of the group name of the original file
+    """
+    return posixpath.join(f"/level{level}", name.lstrip("/"))
+
+
+def _half_color(color: np.ndarray) -> np.ndarray:
+    height, width = color.shape[1] // 2, color.shape[2] // 2
+    out = np.empty((len(color), height, width, color.shape[3]), dtype=color.dtype)
+    # an odd last row or column is cropped, like depth, so both match shape >> level and ScaledIntrinsics
+    for frame, dst in zip(color[:, :2 * height, :2 * width], out):
+        # area averaging 2x2 blocks, so repeated halving averages the whole block
+        dst[...] = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA).reshape(dst.shape)
+    return out
+
+
+def _half_depth(depth: np.ndarray, reduction: str) -> np.ndarray:
+    height, width = depth.shape[1] // 2, depth.shape[2] // 2
+    if reduction == "nearest":
+        return np.ascontiguousarray(depth[:, 0:2 * height:2, 0:2 * width:2])
+
+    # the nearest surface in each block, so foreground edges don't get averaged into the background
+    blocks = depth[:, :2 * height, :2 * width].reshape(len(depth), height, 2, width, 2, depth.shape[3])
+    return blocks.min(axis=(2, 4))
+
+
+def build_pyramid_file(source: Path, dest: Path, levels: int = 2, depth_reduction: str = "min",
+                       batch_size: int = 32):
+    """
+    Writes each group with rgb and depth datasets of an HDF5 file at levels lower resolutions, each half the size of
+    the last, to /level{n}/{group} of dest.
+    """
+    if depth_reduction not in DEPTH_REDUCTIONS:
+        raise ValueError(f"{depth_reduction} is not a valid depth reduction, expected one of {DEPTH_REDUCTIONS}")
+    if levels < 1:
+        raise ValueError(f"Need at least one level, got {levels}")
+
+    part = temp_file(dest)
+
+    try:
+        with h5py.File(source, 'r') as src, h5py.File(part, 'w') as dst:
+            dst.attrs.update(cpdd_levels=levels, cpdd_depth_reduction=depth_reduction)
+
+            groups: List[h5py.Group] = [src["/"]]
+            src.visititems(lambda name, obj: groups.append(obj) if isinstance(obj, h5py.Group) else None)
+
+            for group in groups:
+                if "rgb" not in group or "depth" not in group:
+                    continue
+
+                color, depth = group["rgb"], group["depth"]
+                outputs = []
+                for level in range(1, levels + 1):
+                    out = dst.require_group(level_group(level, group.name))
+                    shapes = [(ds.shape[0], ds.shape[1] >> level, ds.shape[2] >> level, ds.shape[3])
+                              for ds in (color, depth)]
+                    outputs.append([out.create_dataset(name, shape=shape, dtype=ds.dtype,
+                                                       chunks=(1,) + shape[1:], compression=ds.compression,
+                                                       compression_opts=ds.compression_opts)
+                                    for name, ds, shape in zip(("rgb", "depth"), (color, depth), shapes)])
+
+                start = 0
+                for c, d in iter_batches([color, depth], batch_size):
+                    for out_color, out_depth in outputs:
+                        c, d = _half_color(c), _half_depth(d, depth_reduction)
+                        out_color[start:start + len(c)] = c
+                        out_depth[start:start + len(d)] = d
+                    start += len(c)
+    except BaseException:
+        if part.exists():
+            part.unlink()
+        raise
+
+    os.replace(part, dest)
+
+
+def build_pyramid(data_file, levels: int = 2, depth_reduction: str = "min", force: bool = False) -> Path:
+    """
+    Builds lower resolution levels of a downloaded data file, each half the size of the last, and stores them next to
+    it in the local cache.  Data read from the data file can then read a level with data.level(n) or
+    data.batches(level=n).
+
+    :param data_file: The cylindrical, spherical, or pinhole data file
+    :param levels: The number of levels
+    :param depth_reduction: "min" to take the nearest depth in each block, or "nearest" to take one of its pixels
+    :param force: Rebuild the levels even if they exist
+    :return: The pyramid file
+    """
+    dest = data_file.pyramid_file
+
+    if force or not dest.exists():
+        source = data_file.download_file_if_exists
+        # each level is a quarter of the last, with the same compression, so all of them are under a third of the source
+        with get_cache().reserved(dest, source.stat().st_size // 3):
+            build_pyramid_file(source, dest, levels, depth_reduction)
+
+    return dest
@@ -0,0 +1,192 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import h5py
+
+from ._transfer import temp_file
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    requests: int = 0
+    bytes_fetched: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass(frozen=True)
+class RemoteOptions:
+    """
+    :param block_size: The size of each cached block, and the granularity of remote reads
+    :param cache_size: The maximum number of bytes of blocks to keep cached
+    :param readahead: The number of blocks after a missed block to fetch in the same request
+    """
+    block_size: int = 4 * 2 ** 20
+    cache_size: int = 256 * 2 ** 20
+    readahead: int = 1
+
+
+class BlockCacheFile(io.RawIOBase):
+    """
+    A read only file over a remote file that fetches fixed size blocks with ranged requests and keeps the most recently
+    used ones in memory.  A miss also fetches the following readahead blocks, since HDF5 chunks are usually read in
+    order.
+    """
+
+    def __init__(self, fs, path: str, options: RemoteOptions, stats: CacheStats, size: int = None):
+        super().__init__()
+        self._fs = fs
+        self._path = path
+        self._options = options
+        self._stats = stats
+        self._size = fs.size(path) if size is None else size
+        self._max_blocks = max(1, options.cache_size // options.block_size)
+        self._blocks = OrderedDict()
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        return self._pos
+
+    def _fetch(self, first: int):
+        block_size = self._options.block_size
+        last_block = (self._size - 1) // block_size
+
+        last = first
+        end = min(first + min(self._options.readahead, self._max_blocks - 1), last_block)
+        while last < end and last + 1 not in self._blocks:
+            last += 1
+
+        start = first * block_size
+        data = self._fs.read_block(self._path, start, min((last + 1) * block_size, self._size) - start)
+
+        self._stats.requests += 1
+        self._stats.bytes_fetched += len(data)
+
+        for i in range(first, last + 1):
+            self._blocks[i] = data[(i - first) * block_size:(i - first + 1) * block_size]
+
+        while len(self._blocks) > self._max_blocks:
+            self._blocks.popitem(last=False)
+
+    def _block(self, i: int) -> bytes:
+        if i in self._blocks:
+            self._stats.hits += 1
+            self._blocks.move_to_end(i)
+        else:
+            self._stats.misses += 1
+            self._fetch(i)
+        return self._blocks[i]
+
+    def readinto(self, b) -> int:
+        with self._lock:
+            out = memoryview(b).cast("B")
+            n = max(0, min(len(out), self._size - self._pos))
+            block_size = self._options.block_size
+
+            written = 0
+            while written < n:
+                i, offset = divmod(self._pos + written, block_size)
+                block = self._block(i)
+                count = min(n - written, len(block) - offset)
+                out[written:written + count] = block[offset:offset + count]
+                written += count
+
+            self._pos += n
+            return n
+
+    def close(self):
+        self._blocks.clear()
+        super().close()
+
+
+class RemoteH5File(h5py.File):
+    """
+    A h5py File read through a BlockCacheFile, which is closed with it.
+    """
+
+    def __init__(self, fileobj: BlockCacheFile):
+        super().__init__(fileobj, 'r')
+        self._block_cache = fileobj
+
+    def close(self):
+        super().close()
+        self._block_cache.close()
+
+
+def copy_remote_datasets(fs, remote: str, dest: Path, names: Sequence[str], options: RemoteOptions = None,
+                         stats: CacheStats = None, size: int = None, local: Path = None):
+    """
+    Writes a local HDF5 file with only some of a remote file's datasets.  Datasets are copied with their chunks still
+    encoded, so only the metadata and the byte ranges of the chunks of those datasets are fetched.
+
+    :param fs: The filesystem to read from
+    :param remote: The remote HDF5 file
+    :param dest: The local file to write, which is replaced once it is complete
+    :param names: The paths of the datasets to copy, like "front/rgb"
+    :param options: The block cache options for the remote file
+    :param stats: Records the block cache hits and misses
+    :param size: The size of the remote file, looked up if None
+    :param local: A local file to copy any of the datasets it already has from, instead of fetching them
+    """
+    if options is None:
+        options = RemoteOptions(block_size=8 * 2 ** 20, cache_size=64 * 2 ** 20, readahead=4)
+    if stats is None:
+        stats = CacheStats()
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = temp_file(dest)
+
+    local_file = h5py.File(local, 'r') if local is not None and local.exists() else None
+
+    try:
+        with RemoteH5File(BlockCacheFile(fs, remote, options, stats, size)) as src, h5py.File(part, 'w') as dst:
+            for name in names:
+                source = local_file if local_file is not None and name in local_file else src
+                group, _, dataset = name.rpartition('/')
+
+                parent = dst.require_group(group) if group else dst
+                if group:
+                    parent.attrs.update(src[group].attrs)
+
+                source.copy(source[name], parent, name=dataset)
+    except BaseException:
+        if part.exists():
+            part.unlink()
+        raise
+    finally:
+        if local_file is not None:
+            local_file.close()
+
+    os.replace(part, dest)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import argparse
+import json
+import posixpath
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import h5py
+import numpy as np
+
+from ._batches import iter_batches
+from ._cache import FileLock, get_cache, raw_size
+from ._download import data_files
+from ._transfer import temp_dir
+
+_HEADER_NAME = "header.json"
+_REPACK_KINDS = ("pose", "cylindrical", "spherical", "pinhole")
+
+
+def repacked_dir(download_file: Path) -> Path:
+    """
+    The directory a data file is repacked into.
+    """
+    return download_file.parent / "repacked" / download_file.stem
+
+
+class RepackedGroup:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class RepackedFile:
+    """
+    A repacked data file, which can be used in place of an h5py file by Data, SplitData, and PoseData.  Datasets are
+    np.memmap views of contiguous, uncompressed .npy files, so reading them is zero copy and backed by the page cache.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+        with open(directory / _HEADER_NAME) as f:
+            self.header = json.load(f)
+
+        self._arrays: Dict[str, np.ndarray] = {}
+        # keeps the directory from being evicted with its data file while it is open
+        self._file_lock = FileLock(directory / _HEADER_NAME)
+        self._cache = get_cache()
+        self._cache.opened(directory)
+
+    def __getitem__(self, name: str):
+        name = posixpath.join("/", name)
+
+        if name in self.header["groups"]:
+            return RepackedGroup(name)
+
+        if name not in self._arrays:
+            if name not in self.header["datasets"]:
+                raise KeyError(f"{name} is not in {self.directory}")
+            self._arrays[name] = np.load(self.directory / self.header["datasets"][name]["file"], mmap_mode='r')
+
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        name = posixpath.join("/", name)
+        return name in self.header["groups"] or name in self.header["datasets"]
+
+    def close(self):
+        # memmaps are unmapped once they're no longer referenced
+        self._arrays.clear()
+        if self._file_lock is not None:
+            self._cache.closed(self.directory)
+            self._file_lock.release()
+            self._file_lock = None
+
+
+def repack_file(source: Path, dest: Path, batch_size: int = 32):
+    """
+    Writes every dataset of an HDF5 file as a contiguous .npy file, with a header listing them.  The repacked
+    directory is only moved into place once it is complete.
+    """
+    tmp = temp_dir(dest)
+    try:
+        _repack_into(source, tmp, batch_size)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    if dest.exists():
+        shutil.rmtree(dest)
+    tmp.rename(dest)
+
+
+def _repack_into(source: Path, tmp: Path, batch_size: int):
+    header = {"source": source.name, "groups": ["/"], "datasets": {}}
+
+    with h5py.File(source, 'r') as f:
+        datasets: List[h5py.Dataset] = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                datasets.append(obj)
+            else:
+                header["groups"].append("/" + name)
+
+        f.visititems(visit)
+
+        for ds in datasets:
+            file = ds.name.lstrip("/") + ".npy"
+            (tmp / file).parent.mkdir(parents=True, exist_ok=True)
+
+            out = np.lib.format.open_memmap(tmp / file, mode='w+', dtype=ds.dtype, shape=ds.shape)
+            start = 0
+            for (batch,) in iter_batches([ds], batch_size):
+                out[start:start + len(batch)] = batch
+                start += len(batch)
+            out.flush()
+            del out
+
+            header["datasets"][ds.name] = {"file": file, "shape": list(ds.shape), "dtype": ds.dtype.str}
+
+    with open(tmp / _HEADER_NAME, "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def repack(configs: Iterable, kinds: Sequence[str] = ("cylindrical", "spherical", "pinhole"), force: bool = False,
+           batch_size: int = 32) -> list:
+    """
+    Repacks the downloaded data files of configs into contiguous .npy files, which can be read as np.memmaps with
+    DataFile.repacked().  This trades disk space for reads that don't copy or decompress.
+
+    :param configs: The configs to repack, which must be downloaded
+    :param kinds: The kinds of data files to repack
+    :param force: Repack files that are already repacked
+    :param batch_size: The number of frames to copy at once
+    :return: The data files that were repacked
+    """
+    done = []
+    for file in data_files(configs, kinds):
+        if file.is_repacked and not force:
+            continue
+
+        source = file.download_file_if_exists
+        with get_cache().reserved(file.repacked_dir, raw_size(source)):
+            repack_file(source, file.repacked_dir, batch_size)
+        done.append(file)
+
+    return done
+
+
+def main(args: Sequence[str] = None):
+    from ..config import load_csv
+
+    parser = argparse.ArgumentParser(description="Repack downloaded CPDD runs into memory mappable .npy files")
+    parser.add_argument("csv", help="A csv file of configs, see config.load_csv")
+    parser.add_argument("--kinds", nargs="+", default=["cylindrical", "spherical", "pinhole"],
+                        choices=_REPACK_KINDS)
+    parser.add_argument("--force", action="store_true", help="Repack files that are already repacked")
+    args = parser.parse_args(args)
+
+    for file in repack(load_csv(args.csv), args.kinds, args.force):
+        print(f"Repacked {file.download_file} to {file.repacked_dir}")
+
+
+if __name__ == "__main__":
+    main()
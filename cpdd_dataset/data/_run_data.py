@@ -1,23 +1,43 @@
 from __future__ import annotations
 
+import copy
+import os
+import posixpath
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import h5py
+import numpy as np
 import s3fs
 from cpdd_dataset.intrinsics import CylindricalIntrinsics, SphericalIntrinsics, PinholeIntrinsics, Intrinsics
+from ._async import AsyncContext, fetch_file_async, get_async_filesystem, iter_frames_async, run_blocking
+from ._batches import chunk_frames, iter_batches
+from ._cache import CachedH5File, get_cache
+from ._catalog import update_catalog
+from ._depth import FAR_DEPTH, depth_decoder, depth_to_inverse, depth_to_meters, depth_valid_mask
+from ._handles import SharedFile, open_shared
+from ._manifest import RemoteEntry, cached_manifest, get_manifest
+from ._pyramid import level_group
+from ._repack import RepackedFile, repacked_dir
+from ._remote import BlockCacheFile, CacheStats, RemoteH5File, RemoteOptions, copy_remote_datasets
+from ._s3 import get_filesystem
 from ._side import Side
+from ._transfer import fetch_file, remove_partial
 
 
-class DataSource(ABC):
+CHANNELS = ("rgb", "depth")
+
+
+class DataSource(AsyncContext, ABC):
     @property
     @abstractmethod
     def data(self) -> Data:
         pass
 
     def __enter__(self) -> Data:
-        if not self.is_downloaded:
+        if not self.is_readable:
             raise ValueError(f"{self} is  not downloaded")
 
         if hasattr(self, "_open_data"):
@@ -38,9 +58,14 @@ class DataSource(ABC):
     def is_downloaded(self) -> bool:
         pass
 
+    @property
+    @abstractmethod
+    def is_readable(self) -> bool:
+        pass
+
 
 class PoseData:
-    def __init__(self, file: h5py.File):
+    def __init__(self, file: Union[h5py.File, SharedFile]):
         self._file = file
 
     def close(self):
@@ -75,17 +100,29 @@ class PoseData:
 
 
 class Data:
-    def __init__(self, file: h5py.File, data: h5py.Group, intrinsics: Intrinsics):
+    def __init__(self, file: Union[h5py.File, SharedFile], data: h5py.Group, intrinsics: Intrinsics,
+                 pyramid: Optional[Callable[[], SharedFile]] = None, owned: bool = True):
+        """
+        :param pyramid: Opens the file of lower resolution levels made by data.build_pyramid, if there is one
+        :param owned: Whether closing this data closes file.  The sides of a SplitData borrow its file instead.
+        """
         self._data: h5py.Group = data
-        self._file: h5py.File = file
+        self._file: Union[h5py.File, SharedFile] = file
+        self._owned = owned
         self._intrinsics = intrinsics
+        self._pyramid = pyramid
+        self._levels: Dict[int, Data] = {}
+
+    def _dataset(self, name: str) -> h5py.Dataset:
+        # looked up through the file so that shared files can cache it
+        return self._file[posixpath.join(self._data.name, name)]
 
     @property
     def color(self) -> h5py.Dataset:
         """
         :return: A (frames, height, width, 3) uint8 Dataset
         """
-        return self._data["rgb"]
+        return self._dataset("rgb")
 
     @property
     def depth(self) -> h5py.Dataset:
@@ -93,52 +130,254 @@ class Data:
         Depth is measured in dm (10th of a meter).
         :return: A (frames, height, width, 1) uint16 Dataset
         """
-        return self._data["depth"]
+        return self._dataset("depth")
+
+    def depth_meters(self, start: int = 0, stop: int = None, out: Optional[np.ndarray] = None,
+                     max_depth: Optional[float] = FAR_DEPTH) -> np.ndarray:
+        """
+        Reads depth in meters, see data.depth_to_meters.
+
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param out: A (frames, height, width, 1) float32 array to write to
+        :param max_depth: Clip depth to this many meters, or None to not clip
+        :return: out
+        """
+        return depth_to_meters(self.depth[start:stop], out, max_depth)
+
+    def inverse_depth(self, start: int = 0, stop: int = None, out: Optional[np.ndarray] = None,
+                      min_depth: float = 0.1, max_depth: float = FAR_DEPTH) -> np.ndarray:
+        """
+        Reads inverse depth in 1/meters, see data.depth_to_inverse.
+
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param out: A (frames, height, width, 1) float32 array to write to
+        :param min_depth: The minimum depth, in meters
+        :param max_depth: The maximum depth, in meters
+        :return: out
+        """
+        return depth_to_inverse(self.depth[start:stop], out, min_depth, max_depth)
+
+    def valid_mask(self, start: int = 0, stop: int = None, out: Optional[np.ndarray] = None,
+                   min_depth: float = 0.0, max_depth: float = FAR_DEPTH) -> np.ndarray:
+        """
+        Finds the pixels with a real depth, i.e. not the sky, see data.depth_valid_mask.
+
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param out: A (frames, height, width, 1) bool array to write to
+        :param min_depth: Depths at or below this many meters are invalid
+        :param max_depth: Depths at or above this many meters are invalid
+        :return: out
+        """
+        return depth_valid_mask(self.depth[start:stop], out, min_depth, max_depth)
 
     @property
     def intrinsics(self) -> Intrinsics:
         return self._intrinsics
 
+    @property
+    def levels(self) -> int:
+        """
+        The number of lower resolution levels made by data.build_pyramid, 0 if there are none.
+        """
+        if self._pyramid is None:
+            return 0
+        return int(self.level(1)._file["/"].attrs["cpdd_levels"])
+
+    def level(self, level: int) -> Data:
+        """
+        Gets the data of a lower resolution level made by data.build_pyramid, where each level is half the size of
+        the last.  Its intrinsics are scaled to match.  Level 0 is this data.
+        """
+        if level == 0:
+            return self
+        if self._pyramid is None:
+            raise ValueError("There are no pyramid levels, see data.build_pyramid")
+
+        if level not in self._levels:
+            file = self._pyramid()
+            name = level_group(level, self._data.name)
+            if name not in file:
+                file.close()
+                raise ValueError(f"Level {level} was not built")
+            self._levels[level] = Data(file, file[name], self._intrinsics.scaled(2 ** -level))
+        return self._levels[level]
+
+    def _close_levels(self):
+        for data in self._levels.values():
+            data.close()
+        self._levels.clear()
+
+    @property
+    def read_frames(self) -> int:
+        """
+        The number of frames to read at once: the value recorded by data.transcode if the file was transcoded,
+        otherwise the number of frames in each chunk.
+        """
+        attrs = getattr(self._file["/"], "attrs", {})
+        if "cpdd_read_frames" in attrs:
+            return int(attrs["cpdd_read_frames"])
+        return chunk_frames([self.color, self.depth])
+
+    def batches(self, batch_size: int = None, start: int = 0, stop: int = None, prefetch: bool = True,
+                depth_format: str = "raw", level: int = 0, frames: Optional[np.ndarray] = None,
+                **depth_options) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterates over (color, depth) batches.  Batches follow the datasets' chunks, and are read into reused buffers
+        while the previous batch is being used, so the arrays are only valid until the next batch is requested.
+
+        :param batch_size: The number of frames in each batch, rounded up to a whole number of chunks.  Defaults to
+            read_frames.
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param prefetch: Read the next batch on a background thread
+        :param depth_format: "raw" for uint16 dm, or "meters" or "inverse" for float32 depth, which is decoded into
+            reused buffers as it is read
+        :param level: The pyramid level to read, see level
+        :param frames: Only read these frames instead of start to stop, like MotionFilter.frames(config).  Runs of
+            consecutive frames are read at once.
+        :param depth_options: Passed to the depth conversion, like max_depth
+        """
+        if level != 0:
+            return self.level(level).batches(batch_size, start, stop, prefetch, depth_format, frames=frames,
+                                             **depth_options)
+
+        if batch_size is None:
+            batch_size = self.read_frames
+        return iter_batches((self.color, self.depth), batch_size, start, stop, prefetch,
+                            decoders=(None, depth_decoder(depth_format, **depth_options)), frames=frames)
+
+    def frames_async(self, start: int = 0, stop: int = None,
+                     batch_size: int = 1) -> AsyncIterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterates over (color, depth) batches without blocking the event loop, like
+        `async for color, depth in data.frames_async(batch_size=8):`.
+
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param batch_size: The number of frames in each batch
+        """
+        return iter_frames_async(self.color, self.depth, start, stop, batch_size)
+
     def close(self):
-        return self._file.close()
+        self._close_levels()
+        if self._owned:
+            return self._file.close()
+
+
+def _read_into(ds, out: np.ndarray, start: int, stop: int, index: int):
+    if isinstance(ds, np.ndarray):
+        out[:, index] = ds[start:stop]
+    else:
+        ds.read_direct(out, np.s_[start:stop], np.s_[:, index])
 
 
 class SplitData:
-    def __init__(self, file: h5py.File, intrinsics: Intrinsics):
+    def __init__(self, file: Union[h5py.File, SharedFile], intrinsics: Intrinsics,
+                 pyramid: Optional[Callable[[], SharedFile]] = None):
         self._intrinsics = intrinsics
-        self._file: h5py.File = file
+        self._file: Union[h5py.File, SharedFile] = file
+        self._pyramid = pyramid
+        self._sides: Dict[str, Data] = {}
+
+    def _side(self, name: str) -> Data:
+        # the sides borrow this object's file, so closing a side leaves it open for the others until this is closed
+        if name not in self._sides:
+            self._sides[name] = Data(self._file, self._file[name], self._intrinsics, self._pyramid, owned=False)
+        return self._sides[name]
 
     @property
     def top(self) -> Data:
-        return Data(self._file, self._file["top"], self._intrinsics)
+        return self._side("top")
 
     @property
     def bottom(self) -> Data:
-        return Data(self._file, self._file["bottom"], self._intrinsics)
+        return self._side("bottom")
 
     @property
     def left(self) -> Data:
-        return Data(self._file, self._file["left"], self._intrinsics)
+        return self._side("left")
 
     @property
     def right(self) -> Data:
-        return Data(self._file, self._file["right"], self._intrinsics)
+        return self._side("right")
 
     @property
     def front(self) -> Data:
-        return Data(self._file, self._file["front"], self._intrinsics)
+        return self._side("front")
 
     @property
     def back(self) -> Data:
-        return Data(self._file, self._file["back"], self._intrinsics)
+        return self._side("back")
 
     def __getitem__(self, item: Side):
-        return Data(self._file, self._file[item.name.lower()], self._intrinsics)
+        return self._side(item.name.lower())
 
+    def close(self):
+        for side in self._sides.values():
+            side._close_levels()
+        return self._file.close()
 
-class DataFile(ABC):
+    def batches(self, batch_size: int, sides: Sequence[Side] = tuple(Side), start: int = 0, stop: int = None,
+                prefetch: bool = True, depth_format: str = "raw", frames: Optional[np.ndarray] = None,
+                **depth_options) -> Iterator[Dict[Side, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Iterates over batches of each side, like Data.batches.
+
+        :return: An iterator of dicts from each side to its (color, depth) batch
+        """
+        datasets = []
+        for side in sides:
+            datasets.extend((self[side].color, self[side].depth))
+
+        decoders = (None, depth_decoder(depth_format, **depth_options)) * len(sides)
+        for batch in iter_batches(datasets, batch_size, start, stop, prefetch, decoders, frames=frames):
+            yield {side: (batch[2 * i], batch[2 * i + 1]) for i, side in enumerate(sides)}
+
+    def cube(self, start: int = 0, stop: int = None, depth: bool = True,
+             out: Tuple[Optional[np.ndarray], Optional[np.ndarray]] = (None, None)
+             ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Reads all six sides of a range of frames at once, each straight into its slice of one array.  The sides are
+        read one after another, since h5py holds a global lock while reading and decompressing; use ParallelLoader to
+        read in parallel.
+
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param depth: Whether to read depth as well as color
+        :param out: (color, depth) arrays to read into, either of which is allocated if None
+        :return: (color, depth), of shape (frames, 6, 768, 768, C) with sides in Side order.  depth is None if it
+            isn't read.
+        """
+        names = CHANNELS if depth else CHANNELS[:1]
+        start, stop, _ = slice(start, stop).indices(len(self.front.color))
+
+        arrays: List[np.ndarray] = []
+        for name, buf in zip(names, out):
+            ds = self.front._dataset(name)
+            shape = (stop - start, len(Side)) + ds.shape[1:]
+            if buf is None:
+                buf = np.empty(shape, dtype=ds.dtype)
+            elif buf.shape != shape:
+                raise ValueError(f"out has shape {buf.shape}, expected {shape}")
+            arrays.append(buf)
+
+        for side in Side:
+            for name, buf in zip(names, arrays):
+                _read_into(self[side]._dataset(name), buf, start, stop, side.value)
+
+        return arrays[0], arrays[1] if depth else None
+
+
+class DataFile(AsyncContext, ABC):
     def __init__(self, config):
         self._config = config
+        self._remote: RemoteOptions = None
+        self._cache_stats: CacheStats = None
+        self._repacked = False
+        self._variant: str = None
 
     @property
     @abstractmethod
@@ -160,40 +399,229 @@ class DataFile(ABC):
     def remote_location(self) -> str:
         return self._config.remote_location + self.filename
 
+    @property
+    def manifest_key(self) -> str:
+        """
+        The key of this file in the remote manifest.
+        """
+        return self._config.folder_name + "/" + self.filename
+
+    @property
+    def remote_info(self) -> RemoteEntry:
+        """
+        The remote size and ETag of this file, from the manifest.  None if it doesn't exist remotely.
+        """
+        return get_manifest().get(self.manifest_key)
+
     @property
     def is_downloaded(self) -> bool:
-        return self.download_file.exists()
+        """
+        Whether the file exists locally, and has the size listed in the manifest if one has been loaded.
+        """
+        if not self.download_file.exists():
+            return False
 
-    @abstractmethod
-    def download(self, force: bool = False) -> DataFile:
-        pass
+        manifest = cached_manifest()
+        entry = manifest.get(self.manifest_key) if manifest is not None else None
+        return entry is None or entry.size == self.download_file.stat().st_size
 
     @property
-    @abstractmethod
-    def intrinsics(self) -> Intrinsics:
-        pass
+    def is_remote(self) -> bool:
+        return self._remote is not None
+
+    @property
+    def is_readable(self) -> bool:
+        """
+        Whether the file can be opened, either because it's downloaded or because it's in remote mode.
+        """
+        if self._repacked:
+            return self.is_repacked
+        if self._variant is not None:
+            return self.variant_file(self._variant).exists()
+        return self.is_downloaded or self.is_remote
+
+    @property
+    def repacked_dir(self) -> Path:
+        return repacked_dir(self.download_file)
+
+    @property
+    def is_repacked(self) -> bool:
+        """
+        Whether this file has been repacked with data.repack.
+        """
+        return (self.repacked_dir / "header.json").exists()
+
+    def repacked(self) -> DataFile:
+        """
+        Gets a copy of this data file that reads the repacked version of the file (see data.repack), whose datasets
+        are np.memmaps instead of h5py Datasets.
+        """
+        other = copy.copy(self)
+        other._repacked = True
+        return other
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        """
+        The block cache hit and miss counts of every remote read made through this data file, or None if not in
+        remote mode.  Each remote() view has its own block cache and counts, shared only with its copies.
+        """
+        return self._cache_stats
+
+    def remote(self, block_size: int = RemoteOptions.block_size, cache_size: int = RemoteOptions.cache_size,
+               readahead: int = RemoteOptions.readahead) -> DataFile:
+        """
+        Gets a copy of this data file in remote mode, which reads the file straight from S3 if it isn't downloaded.
+        Reads go through a block cache, so only the blocks holding the chunks that are accessed are fetched.
+
+        :param block_size: The size of each cached block, and the granularity of remote reads
+        :param cache_size: The maximum number of bytes of blocks to keep cached per open file
+        :param readahead: The number of blocks after a missed block to fetch in the same request
+        :return: A new data file in remote mode
+        """
+        other = copy.copy(self)
+        other._remote = RemoteOptions(block_size, cache_size, readahead)
+        other._cache_stats = CacheStats()
+        return other
+
+    def variant_file(self, name: str) -> Path:
+        """
+        The local file of a transcoded variant of this file (see data.transcode).  Variants are namespaced, so no name
+        can collide with the pyramid or another file next to the download.
+        """
+        if not name or "/" in name or os.sep in name:
+            raise ValueError(f"{name!r} is not a valid variant name")
+        return self.download_file.with_name(f"{self.download_file.stem}.variant-{name}.hdf5")
+
+    @property
+    def pyramid_file(self) -> Path:
+        """
+        The local file of lower resolution levels of this file (see data.build_pyramid).
+        """
+        return self.download_file.with_name(f"{self.download_file.stem}.pyramid.hdf5")
+
+    def _pyramid_opener(self) -> Optional[Callable[[], SharedFile]]:
+        path = self.pyramid_file
+        if not path.exists():
+            return None
+        return lambda: open_shared(path, lambda: CachedH5File(path))
+
+    def transcoded(self, name: str) -> DataFile:
+        """
+        Gets a copy of this data file that reads a transcoded variant of the file, made with data.transcode.
+
+        :param name: The name of the variant, which is its preset unless it was given a name
+        """
+        other = copy.copy(self)
+        other._variant = name
+        return other
+
+    @property
+    def _reads_download_file(self) -> bool:
+        return not self._repacked and self._variant is None
+
+    def _open(self) -> Union[SharedFile, RepackedFile]:
+        """
+        Opens the file, or gets another reference to it if it is already open in this process.  Close the result to
+        release it.
+        """
+        if self._repacked:
+            if not self.is_repacked:
+                raise ValueError(f"{self} is not repacked")
+            return RepackedFile(self.repacked_dir)
+
+        if self._variant is not None:
+            path = self.variant_file(self._variant)
+            if not path.exists():
+                raise ValueError(f"{self} has no {self._variant} variant")
+            return open_shared(path, lambda: CachedH5File(path))
+
+        if self.is_downloaded or not self.is_remote:
+            path = self.download_file_if_exists
+            return open_shared(path, lambda: CachedH5File(path))
+
+        manifest = cached_manifest()
+        entry = manifest.get(self.manifest_key) if manifest is not None else None
+
+        # keyed by the view's stats too, so other remote() views don't share its block cache and counts
+        return open_shared((self.remote_location, self._remote, id(self._cache_stats)), lambda: RemoteH5File(
+            BlockCacheFile(get_filesystem(), self.remote_location, self._remote, self._cache_stats,
+                           entry.size if entry is not None else None)))
 
     @property
     def remote_exists(self) -> bool:
         if self.is_downloaded:
             return True
 
-        fs = s3fs.S3FileSystem()
+        return self.manifest_key in get_manifest()
+
+    def _download(self, force: bool = False, fs: s3fs.S3FileSystem = None, workers: int = 4,
+                  progress: Optional[Callable[[int], None]] = None):
+        """
+        Downloads to a part file using parallel ranged requests, which is only moved to download_file once it is
+        complete and verified, so an interrupted download is never mistaken for a downloaded file.  An interrupted
+        download is resumed unless force is set.  Least recently used files are evicted from the local cache first if
+        the download would put it over budget.  progress is called with the size of each chunk as it is written.
+        """
+        if self.is_downloaded and not force:
+            return
 
-        return fs.exists(self.remote_location)
+        if force:
+            remove_partial(self.download_file)
 
+        if fs is None:
+            fs = get_filesystem()
 
-    def _download(self, force: bool = False):
+        entry = get_manifest().get(self.manifest_key)
+
+        if entry is None:
+            # the manifest may be out of date
+            info = fs.info(self.remote_location)
+            entry = RemoteEntry(info["size"], (info.get("ETag") or "").strip('"'))
+
+        with get_cache().reserved(self.download_file, entry.size):
+            fetch_file(fs, self.remote_location, self.download_file, entry.size, entry.etag, workers=workers,
+                       progress=progress)
+        update_catalog([self])
+
+    async def download_async(self, force: bool = False) -> DataFile:
+        """
+        The async version of download, which shares the event loop's S3 client and request semaphore.
+        """
         if self.is_downloaded and not force:
-            return
+            return self
+
+        if force:
+            remove_partial(self.download_file)
+
+        entry = (await run_blocking(get_manifest)).get(self.manifest_key)
+
+        if entry is None:
+            info = await (await get_async_filesystem())._info(self.remote_location)
+            entry = RemoteEntry(info["size"], (info.get("ETag") or "").strip('"'))
+
+        cache = get_cache()
+        await run_blocking(cache.evict, entry.size, None, self.download_file)
 
-        if self.is_downloaded and self.download_file.exists():
-            self.download_file.unlink()
+        try:
+            await fetch_file_async(self.remote_location, self.download_file, entry.size, entry.etag)
+        except BaseException:
+            cache.release(self.download_file)
+            raise
+        await run_blocking(cache.touch, self.download_file)
+        await run_blocking(update_catalog, [self])
+        return self
 
-        self.download_file.parent.mkdir(parents=True, exist_ok=True)
+    def pin(self) -> DataFile:
+        """
+        Keeps this file from being evicted from the local cache until it is unpinned.
+        """
+        get_cache().pin(self.download_file)
+        return self
 
-        fs = s3fs.S3FileSystem()
-        fs.get(self.remote_location, str(self.download_file))
+    def unpin(self) -> DataFile:
+        get_cache().unpin(self.download_file)
+        return self
 
 
 class PoseDataFile(DataFile):
@@ -212,10 +640,10 @@ class PoseDataFile(DataFile):
 
     @property
     def data(self) -> PoseData:
-        return PoseData(h5py.File(self.download_file_if_exists, 'r'))
+        return PoseData(self._open())
 
     def __enter__(self) -> PoseData:
-        if not self.is_downloaded:
+        if not self.is_readable:
             raise ValueError(f"{self} is  not downloaded")
 
         if hasattr(self, "_open_data"):
@@ -244,8 +672,8 @@ class CylindricalDataFile(DataFile, DataSource):
 
     @property
     def data(self) -> Data:
-        file = h5py.File(self.download_file_if_exists, 'r')
-        return Data(file, file, self.intrinsics)
+        file = self._open()
+        return Data(file, file["/"], self.intrinsics, self._pyramid_opener())
 
     @property
     def intrinsics(self) -> CylindricalIntrinsics:
@@ -270,8 +698,8 @@ class SphericalDataFile(DataFile, DataSource):
 
     @property
     def data(self) -> Data:
-        file = h5py.File(self.download_file_if_exists, 'r')
-        return Data(file, file, self.intrinsics)
+        file = self._open()
+        return Data(file, file["/"], self.intrinsics, self._pyramid_opener())
 
     @property
     def intrinsics(self) -> SphericalIntrinsics:
@@ -296,15 +724,31 @@ class PinholeDataFile(DataFile):
         return "pinhole.hdf5"
 
     def __enter__(self) -> SplitData:
-        if not self.is_downloaded:
+        if not self.is_readable:
             raise ValueError(f"{self} is  not downloaded")
 
-        file = h5py.File(self.download_file_if_exists, 'r')
-        self._open_file = file
-        return SplitData(file, self.intrinsics)
+        if hasattr(self, "_open_data"):
+            return self._open_data
+
+        self._open_data = SplitData(self._open(), self.intrinsics, self._pyramid_opener())
+        return self._open_data
 
     def __exit__(self, exc_type, exc_val: SplitData, exc_tb):
-        self._open_file.close()
+        self._open_data.close()
+        del self._open_data
+
+    def cube(self, start: int = 0, stop: int = None, depth: bool = True,
+             out: Tuple[Optional[np.ndarray], Optional[np.ndarray]] = (None, None)
+             ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Reads all six sides of a range of frames at once, see SplitData.cube.  Uses the open file if this is open,
+        otherwise opens it for the read.
+        """
+        if hasattr(self, "_open_data"):
+            return self._open_data.cube(start, stop, depth, out)
+
+        with self as data:
+            return data.cube(start, stop, depth, out)
 
     @property
     def intrinsics(self) -> PinholeIntrinsics:
@@ -351,14 +795,79 @@ class PinholeDataFileSide(DataSource):
     def intrinsics(self) -> PinholeIntrinsics:
         return self.data_file.intrinsics
 
+    @property
+    def side_file(self) -> Path:
+        """
+        The local file holding only this side, used when the whole pinhole file isn't downloaded.
+        """
+        return self.data_file.download_file.with_name(f"pinhole_{self.side}.hdf5")
+
+    @property
+    def local_file(self) -> Path:
+        """
+        The local file this side is read from: the whole pinhole file if it is downloaded, otherwise side_file.
+        """
+        if self.data_file.is_downloaded:
+            return self.data_file.download_file
+        if self.side_file.exists():
+            return self.side_file
+        raise ValueError(f"{self} is  not downloaded")
+
+    def _side_file_channels(self) -> Sequence[str]:
+        if not self.side_file.exists():
+            return []
+
+        with h5py.File(self.side_file, 'r') as f:
+            return list(f[self.side].keys()) if self.side in f else []
+
     @property
     def data(self) -> Data:
-        file = h5py.File(self.data_file.download_file_if_exists, 'r')
-        return Data(file, file[self.side], self.data_file.intrinsics)
+        if not self.data_file.is_downloaded and self.data_file._reads_download_file and self.side_file.exists():
+            path = self.side_file
+            file = open_shared(path, lambda: CachedH5File(path))
+        else:
+            file = self.data_file._open()
+        return Data(file, file[self.side], self.data_file.intrinsics, self.data_file._pyramid_opener())
+
+    def download(self, force: bool = False, channels: Sequence[str] = CHANNELS) -> PinholeDataFileSide:
+        """
+        Downloads only this side's groups of the pinhole file, into side_file.  Does nothing if the whole pinhole
+        file is downloaded.
+
+        :param force: Re-download the side even if it is already downloaded
+        :param channels: Which of "rgb" and "depth" to download
+        """
+        if self.is_downloaded(channels) and not force:
+            return self
+
+        existing = [] if force else self._side_file_channels()
+        channels = list(dict.fromkeys(list(existing) + list(channels)))
 
-    def download(self, force: bool = False) -> PinholeDataFileSide:
-        self.data_file.download(force)
+        entry = self.data_file.remote_info
+        # a rough estimate, the sides and channels aren't all the same size
+        needed = entry.size * len(channels) // (2 * len(Side)) if entry is not None else 0
+
+        with get_cache().reserved(self.side_file, needed):
+            copy_remote_datasets(get_filesystem(), self.data_file.remote_location, self.side_file,
+                                 [f"{self.side}/{c}" for c in channels],
+                                 size=entry.size if entry is not None else None,
+                                 local=None if force else self.side_file)
         return self
 
-    def is_downloaded(self) -> bool:
-        return self.data_file.is_downloaded
+    async def download_async(self, force: bool = False, channels: Sequence[str] = CHANNELS) -> PinholeDataFileSide:
+        await run_blocking(self.download, force, channels)
+        return self
+
+    def is_downloaded(self, channels: Sequence[str] = CHANNELS) -> bool:
+        """
+        :param channels: The channels that must be downloaded
+        :return: Whether the whole pinhole file, or this side with those channels, is downloaded
+        """
+        if self.data_file.is_downloaded:
+            return True
+
+        return set(channels).issubset(self._side_file_channels())
+
+    @property
+    def is_readable(self) -> bool:
+        return self.data_file.is_readable or self.side_file.exists()
@@ -0,0 +1,25 @@
+import os
+import threading
+
+import s3fs
+
+REMOTE_ROOT = "s3://cscdatasets/jventu09/cpdd_dataset/"
+
+_fs = None
+_fs_pid = None
+_fs_lock = threading.Lock()
+
+
+def get_filesystem() -> s3fs.S3FileSystem:
+    """
+    The S3 filesystem client shared by every data file in this process.  It is re-created after a fork, since
+    connection pools can't be shared between processes.
+    """
+    global _fs, _fs_pid
+
+    with _fs_lock:
+        if _fs is None or _fs_pid != os.getpid():
+            _fs = s3fs.S3FileSystem()
+            _fs_pid = os.getpid()
+
+        return _fs
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from ._depth import FAR_DEPTH, METERS_PER_UNIT
+from ._side import Side
+from ._transfer import temp_file
+
+STATS_KINDS = ("cylindrical", "spherical", "pinhole")
+
+# one bin per raw uint16 depth value, so the histogram is exact and can be rebinned to anything
+_DEPTH_VALUES = 1 << 16
+
+
+def _meters() -> np.ndarray:
+    # divided rather than multiplied by the float32 0.1, so whole meters are exact
+    return np.arange(_DEPTH_VALUES) / round(1 / float(METERS_PER_UNIT))
+
+
+@dataclass
+class ChannelMoments:
+    """
+    The per-channel count, mean, and sum of squared differences from the mean (Welford's M2) of some pixels.  Batches
+    are reduced on their own and merged in with Chan et al.'s update, so moments of separate runs can be merged too.
+    """
+    count: int = 0
+    mean: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    m2: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.m2 / self.count if self.count else np.full_like(self.m2, np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def merge(self, other: ChannelMoments) -> ChannelMoments:
+        """
+        :return: The moments of both sets of pixels
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        mean = self.mean + delta * (other.count / count)
+        m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / count)
+        return ChannelMoments(count, mean, m2)
+
+    def update(self, batch: np.ndarray) -> ChannelMoments:
+        """
+        :param batch: A (..., C) array of pixels
+        :return: The moments with the pixels of batch added
+        """
+        pixels = batch.reshape(-1, batch.shape[-1])
+        if len(pixels) == 0:
+            return self
+
+        mean = pixels.mean(axis=0, dtype=np.float64)
+        if np.issubdtype(pixels.dtype, np.integer) and pixels.dtype.itemsize <= 2:
+            # exact in int64, and much faster than subtracting the mean in float64
+            squares = np.einsum("ij,ij->j", pixels, pixels, dtype=np.int64).astype(np.float64)
+            m2 = np.maximum(squares - len(pixels) * mean ** 2, 0)
+        else:
+            m2 = ((pixels - mean) ** 2).sum(axis=0, dtype=np.float64)
+
+        return self.merge(ChannelMoments(len(pixels), mean, m2))
+
+
+@dataclass
+class DepthHistogram:
+    """
+    The number of pixels with each raw depth value, in decimeters.  Any histogram in meters can be made from it.
+    """
+    counts: np.ndarray = field(default_factory=lambda: np.zeros(_DEPTH_VALUES, dtype=np.int64))
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def merge(self, other: DepthHistogram) -> DepthHistogram:
+        return DepthHistogram(self.counts + other.counts)
+
+    def update(self, raw: np.ndarray) -> DepthHistogram:
+        """
+        :param raw: An array of raw uint16 depth
+        """
+        return DepthHistogram(self.counts + np.bincount(raw.ravel(), minlength=_DEPTH_VALUES))
+
+    def histogram(self, edges: Sequence[float]) -> np.ndarray:
+        """
+        :param edges: Increasing bin edges in meters, like np.histogram's
+        :return: The number of pixels in each bin, with the last bin including its right edge
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        meters = _meters()
+        bins = np.searchsorted(edges, meters, side="right") - 1
+        bins[meters == edges[-1]] = len(edges) - 2
+
+        inside = (bins >= 0) & (bins < len(edges) - 1)
+        return np.bincount(bins[inside], weights=self.counts[inside], minlength=len(edges) - 1).astype(np.int64)
+
+    def moments(self, max_depth: float = FAR_DEPTH) -> ChannelMoments:
+        """
+        :param max_depth: Only count pixels closer than this many meters, which by default skips the sky
+        :return: The mean and variance of depth in meters
+        """
+        meters = _meters()
+        keep = meters < max_depth
+        counts, meters = self.counts[keep], meters[keep]
+
+        count = int(counts.sum())
+        if count == 0:
+            return ChannelMoments(0, np.zeros(1), np.zeros(1))
+        mean = (counts * meters).sum() / count
+        m2 = (counts * (meters - mean) ** 2).sum()
+        return ChannelMoments(count, np.array([mean]), np.array([m2]))
+
+
+@dataclass
+class DataStats:
+    """
+    The statistics of the frames of one or more runs.
+    """
+    frames: int = 0
+    color: ChannelMoments = field(default_factory=ChannelMoments)
+    depth: DepthHistogram = field(default_factory=DepthHistogram)
+
+    def merge(self, other: DataStats) -> DataStats:
+        return DataStats(self.frames + other.frames, self.color.merge(other.color), self.depth.merge(other.depth))
+
+    def save(self, path: Path):
+        part = temp_file(path)
+        with open(part, "wb") as f:
+            np.savez_compressed(f, frames=self.frames, color_count=self.color.count, color_mean=self.color.mean,
+                                color_m2=self.color.m2, depth_counts=self.depth.counts)
+        os.replace(part, path)
+
+    @staticmethod
+    def load(path: Path) -> DataStats:
+        with np.load(path) as f:
+            return DataStats(int(f["frames"]),
+                             ChannelMoments(int(f["color_count"]), f["color_mean"], f["color_m2"]),
+                             DepthHistogram(f["depth_counts"]))
+
+
+def stats_file(config, kind: str) -> Path:
+    """
+    :return: Where the stats of a config's data file of kind are cached, next to it
+    """
+    return config.download_location / f"stats.{kind}.npz"
+
+
+def _data_file(config, kind: str):
+    if kind not in STATS_KINDS:
+        raise ValueError(f"{kind} is not a valid kind, expected one of {STATS_KINDS}")
+    return getattr(config, f"{kind}_data")
+
+
+def _is_cached(config, kind: str) -> bool:
+    file = stats_file(config, kind)
+    if not file.exists():
+        return False
+
+    # stats outlive their data file when it's evicted, but not when it's downloaded again
+    data_file = _data_file(config, kind).download_file
+    return not data_file.exists() or file.stat().st_mtime >= data_file.stat().st_mtime
+
+
+def run_stats(config, kind: str = "cylindrical", batch_size: Optional[int] = None, force: bool = False) -> DataStats:
+    """
+    Gets the stats of a run's data file, reading it in batches if the stats aren't cached.  Pinhole stats pool all
+    six sides.
+
+    :param config: The config
+    :param kind: "cylindrical", "spherical", or "pinhole"
+    :param batch_size: The number of frames to read at once, defaults to Data.read_frames
+    :param force: Recompute the stats even if they are cached
+    """
+    file = stats_file(config, kind)
+    if not force and _is_cached(config, kind):
+        return DataStats.load(file)
+
+    data_file = _data_file(config, kind)
+    stats = DataStats()
+    with data_file as data:
+        for d in ([data[side] for side in Side] if kind == "pinhole" else [data]):
+            for color, depth in d.batches(batch_size):
+                stats = DataStats(stats.frames + len(color), stats.color.update(color), stats.depth.update(depth))
+
+    stats.save(file)
+    return stats
+
+
+def _run_stats(args) -> DataStats:
+    return run_stats(*args)
+
+
+def compute_stats(configs: Iterable, kind: str = "cylindrical", workers: int = 4, batch_size: Optional[int] = None,
+                  force: bool = False, start_method: str = "spawn") -> DataStats:
+    """
+    Gets the stats of a split, from the cached stats of each run.  Runs that aren't cached are read in parallel on
+    worker processes, and cached for any later split that includes them.
+
+    :param configs: The configs of the split, whose data files of kind are downloaded unless their stats are cached
+    :param kind: "cylindrical", "spherical", or "pinhole"
+    :param workers: The number of worker processes
+    :param batch_size: The number of frames to read at once, defaults to Data.read_frames
+    :param force: Recompute the stats of every run
+    :param start_method: The multiprocessing start method for the workers
+    :return: The merged stats, like stats.color.mean and stats.color.std for normalization
+    """
+    configs = list(dict.fromkeys(configs))
+    missing = [c for c in configs if force or not _is_cached(c, kind)]
+
+    runs = {}
+    if len(missing) > 1 and workers > 1:
+        context = multiprocessing.get_context(start_method)
+        with ProcessPoolExecutor(min(workers, len(missing)), mp_context=context) as pool:
+            runs.update(zip(missing, pool.map(_run_stats, [(c, kind, batch_size, True) for c in missing])))
+    else:
+        runs.update((c, run_stats(c, kind, batch_size, True)) for c in missing)
+
+    stats = DataStats()
+    for config in configs:
+        stats = stats.merge(runs[config] if config in runs else DataStats.load(stats_file(config, kind)))
+    return stats
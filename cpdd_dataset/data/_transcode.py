@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import h5py
+
+from ._batches import iter_batches
+from ._cache import get_cache, raw_size
+from ._transfer import temp_file
+
+try:
+    # registers the Blosc filter, which is needed to read Blosc files too
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+CODECS = ("none", "gzip", "lzf", "blosc-lz4")
+
+
+@dataclass(frozen=True)
+class Preset:
+    """
+    :param frames: The number of frames in each chunk
+    :param bands: The number of horizontal bands each frame is split into
+    :param codec: The default codec
+    :param read_frames: The number of frames to read at once
+    """
+    frames: int
+    bands: int
+    codec: str
+    read_frames: int
+
+
+PRESETS = {
+    # one frame per chunk, so a random frame reads and decodes exactly one chunk
+    "shuffled": Preset(frames=1, bands=1, codec="none", read_frames=1),
+    # a few frames per chunk, compressed, for long scans over whole runs
+    "sequential": Preset(frames=4, bands=1, codec="lzf", read_frames=32),
+    # each frame split into row bands, so crops around the horizon only read the bands they touch
+    "horizon": Preset(frames=1, bands=8, codec="none", read_frames=1),
+}
+
+
+def _codec_options(codec: str) -> dict:
+    if codec == "none":
+        return {}
+    elif codec == "gzip":
+        return {"compression": "gzip", "compression_opts": 4}
+    elif codec == "lzf":
+        return {"compression": "lzf"}
+    elif codec == "blosc-lz4":
+        if hdf5plugin is None:
+            raise ImportError("hdf5plugin is required for the blosc-lz4 codec")
+        return dict(hdf5plugin.Blosc(cname="lz4", clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    else:
+        raise ValueError(f"{codec} is not a valid codec, expected one of {CODECS}")
+
+
+def _preset(preset: str) -> Preset:
+    if preset not in PRESETS:
+        raise ValueError(f"{preset} is not a valid preset, expected one of {tuple(PRESETS)}")
+    return PRESETS[preset]
+
+
+def _chunks(shape: Tuple[int, ...], preset: Preset) -> Tuple[int, ...]:
+    frames = min(preset.frames, shape[0])
+    rows = -(-shape[1] // preset.bands)
+    return (frames, rows) + tuple(shape[2:])
+
+
+def transcode_file(source: Path, dest: Path, preset: str = "shuffled", codec: Optional[str] = None,
+                   chunks: Optional[Tuple[int, ...]] = None):
+    """
+    Rewrites an HDF5 file with a new chunk layout and codec for its frame datasets.  Other datasets are copied as is.
+    The parameters are recorded as attributes: cpdd_preset, cpdd_codec, and cpdd_read_frames on the file, and
+    cpdd_chunks on each frame dataset.
+
+    :param source: The file to transcode
+    :param dest: The file to write, which is replaced once it is complete
+    :param preset: One of PRESETS
+    :param codec: One of CODECS, defaults to the preset's codec
+    :param chunks: The chunk shape for the frame datasets, overriding the preset's
+    """
+    settings = _preset(preset)
+    codec = codec or settings.codec
+    options = _codec_options(codec)
+    part = temp_file(dest)
+
+    try:
+        with h5py.File(source, 'r') as src, h5py.File(part, 'w') as dst:
+            dst.attrs.update(src.attrs)
+            dst.attrs.update(cpdd_preset=preset, cpdd_codec=codec, cpdd_read_frames=settings.read_frames)
+
+            # collected first, since h5py holds its lock during visititems, which the batch prefetching needs
+            objects = []
+            src.visititems(lambda name, obj: objects.append((name, obj)))
+
+            for name, obj in objects:
+                if isinstance(obj, h5py.Group):
+                    dst.require_group(name).attrs.update(obj.attrs)
+                    continue
+
+                if obj.ndim != 4:
+                    src.copy(obj, dst, name=name)
+                    continue
+
+                layout = tuple(chunks) if chunks is not None else _chunks(obj.shape, settings)
+                out = dst.create_dataset(name, shape=obj.shape, dtype=obj.dtype, chunks=layout, **options)
+                out.attrs.update(obj.attrs)
+                out.attrs["cpdd_chunks"] = layout
+
+                start = 0
+                for (batch,) in iter_batches([obj], max(layout[0], 8)):
+                    out[start:start + len(batch)] = batch
+                    start += len(batch)
+    except BaseException:
+        if part.exists():
+            part.unlink()
+        raise
+
+    os.replace(part, dest)
+
+
+def transcode(data_file, preset: str = "shuffled", codec: Optional[str] = None,
+              chunks: Optional[Tuple[int, ...]] = None, name: Optional[str] = None, force: bool = False) -> Path:
+    """
+    Transcodes a downloaded data file for an access pattern.  The result is written next to the original, and read
+    with data_file.transcoded(name).
+
+    :param data_file: The data file to transcode
+    :param preset: "shuffled" for random single frames, "sequential" for long scans, or "horizon" for crops of
+        horizontal bands
+    :param codec: One of "none", "gzip", "lzf", or "blosc-lz4" (needs hdf5plugin), defaults to the preset's codec
+    :param chunks: The chunk shape for the frame datasets, overriding the preset's
+    :param name: The name of the transcoded variant, defaults to the preset
+    :param force: Transcode even if the variant already exists
+    :return: The transcoded file
+    """
+    dest = data_file.variant_file(name or preset)
+
+    if force or not dest.exists():
+        source = data_file.download_file_if_exists
+        # uncompressed variants can be much larger than their compressed source
+        size = raw_size(source) if (codec or _preset(preset).codec) == "none" else source.stat().st_size
+        with get_cache().reserved(dest, size):
+            transcode_file(source, dest, preset, codec, chunks)
+
+    return dest
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CHUNK_SIZE = 64 * 2 ** 20
+_HASH_BLOCK = 8 * 2 ** 20
+
+# tempfile makes private files, which would stay private once they're moved into place
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def part_file(dest: Path) -> Path:
+    """
+    The temporary file a download is written to before it is complete.
+    """
+    return dest.with_name(dest.name + ".part")
+
+
+def temp_file(dest: Path) -> Path:
+    """
+    A new, empty file next to dest to write it to, unique to the caller so concurrent writers don't share it.  Move it
+    over dest with os.replace once it is complete.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=dest.parent, prefix=dest.name + ".", suffix=".tmp", delete=False) as f:
+        path = Path(f.name)
+    os.chmod(path, 0o666 & ~_UMASK)
+    return path
+
+
+def temp_dir(dest: Path) -> Path:
+    """
+    A new, empty directory next to dest to write it to, like temp_file.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(dir=dest.parent, prefix=dest.name + ".", suffix=".tmp"))
+    os.chmod(path, 0o777 & ~_UMASK)
+    return path
+
+
+@contextmanager
+def exclusive_lock(path: Path):
+    """
+    Holds an exclusive lock on a lock file, created if needed, so only one process at a time gets past it.  Does
+    nothing where fcntl isn't available.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _state_file(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part.json")
+
+
+def _lock_file(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part.lock")
+
+
+def remove_partial(dest: Path):
+    """
+    Deletes any partial download of dest.
+    """
+    for f in (part_file(dest), _state_file(dest)):
+        if f.exists():
+            f.unlink()
+
+
+def _chunks(size: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+    return [(i, start, min(start + chunk_size, size)) for i, start in enumerate(range(0, size, chunk_size))]
+
+
+def _load_state(dest: Path, size: int, etag: str, chunk_size: int) -> Set[int]:
+    """
+    :return: The indices of the chunks already written to the part file, if it belongs to the same remote file
+    """
+    try:
+        with open(_state_file(dest)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+
+    if not part_file(dest).exists() or state.get("size") != size or state.get("etag") != etag or \
+            state.get("chunk_size") != chunk_size:
+        return set()
+
+    return set(state["done"])
+
+
+def _save_state(dest: Path, size: int, etag: str, chunk_size: int, done: Set[int]):
+    state_file = _state_file(dest)
+    tmp = state_file.with_name(state_file.name + ".tmp")
+
+    with open(tmp, "w") as f:
+        json.dump({"size": size, "etag": etag, "chunk_size": chunk_size, "done": sorted(done)}, f)
+
+    os.replace(tmp, state_file)
+
+
+def _md5_parts(file: Path, part_size: int) -> List[bytes]:
+    digests = []
+    with open(file, "rb") as f:
+        while True:
+            md5 = hashlib.md5()
+            remaining = part_size
+            while remaining > 0:
+                block = f.read(min(_HASH_BLOCK, remaining))
+                if not block:
+                    break
+                md5.update(block)
+                remaining -= len(block)
+
+            if remaining == part_size:
+                return digests
+            digests.append(md5.digest())
+
+
+def matches_etag(file: Path, size: int, etag: str) -> Optional[bool]:
+    """
+    Checks a local file against an S3 ETag.  Plain ETags are the file's MD5, multipart ETags are the MD5 of the part
+    MD5s, so we try the part sizes that are consistent with the part count.
+
+    :return: Whether the file matches, or None if the ETag can't be checked
+    """
+    if not etag:
+        return None
+
+    if "-" not in etag:
+        md5 = hashlib.md5()
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                md5.update(block)
+        return md5.hexdigest() == etag
+
+    etag_hash, parts = etag.split("-", 1)
+    parts = int(parts)
+
+    candidates = {8 * 2 ** 20, 2 ** 20 * math.ceil(size / parts / 2 ** 20)}
+    candidates = [c for c in candidates if c > 0 and math.ceil(size / c) == parts]
+
+    if not candidates:
+        return None
+
+    for part_size in candidates:
+        if hashlib.md5(b"".join(_md5_parts(file, part_size))).hexdigest() == etag_hash:
+            return True
+
+    return False
+
+
+def prepare(dest: Path, size: int, etag: str, chunk_size: int) -> Tuple[Set[int], List[Tuple[int, int, int]]]:
+    """
+    Sets up the part file for a download, keeping any chunks from an interrupted download of the same remote file.
+
+    :return: The indices of the finished chunks, and the (index, start, end) chunks still to fetch
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    done = _load_state(dest, size, etag, chunk_size)
+
+    if not done:
+        with open(part_file(dest), "wb") as f:
+            f.truncate(size)
+        _save_state(dest, size, etag, chunk_size, done)
+
+    return done, [c for c in _chunks(size, chunk_size) if c[0] not in done]
+
+
+def write_chunk(dest: Path, start: int, block: bytes):
+    with open(part_file(dest), "r+b") as f:
+        f.seek(start)
+        f.write(block)
+
+
+def mark_done(dest: Path, size: int, etag: str, chunk_size: int, done: Set[int], i: int):
+    done.add(i)
+    _save_state(dest, size, etag, chunk_size, done)
+
+
+def finish(remote: str, dest: Path, size: int, etag: str, verify: bool = True):
+    """
+    Checks the part file's size and checksum and moves it to dest.
+    """
+    part = part_file(dest)
+
+    if part.stat().st_size != size:
+        remove_partial(dest)
+        raise IOError(f"Downloaded {remote} has the wrong size: expected {size}, got {part.stat().st_size}")
+
+    if verify and matches_etag(part, size, etag) is False:
+        remove_partial(dest)
+        raise IOError(f"Downloaded {remote} does not match its checksum")
+
+    os.replace(part, dest)
+    _state_file(dest).unlink()
+
+
+def fetch_file(fs, remote: str, dest: Path, size: Optional[int] = None, etag: Optional[str] = None,
+               chunk_size: int = CHUNK_SIZE, workers: int = 4, verify: bool = True,
+               progress: Optional[Callable[[int], None]] = None):
+    """
+    Downloads a remote file using ranged requests, written to a part file that is only renamed to dest once it is
+    complete and its size and checksum match the remote file.  If a previous download of the same remote file was
+    interrupted, only the chunks it didn't finish are fetched.  Downloads of the same file in other threads or
+    processes wait for this one, and don't download it again if it finishes.
+
+    :param fs: The filesystem to download from
+    :param remote: The remote path
+    :param dest: The local path to download to
+    :param size: The size of the remote file, looked up if None
+    :param etag: The ETag of the remote file, looked up if size is None
+    :param chunk_size: The size of each ranged request
+    :param workers: The number of chunks to fetch concurrently
+    :param verify: Whether to check the downloaded file against the remote ETag
+    :param progress: Called from the transfer threads with the size of each chunk once it is written
+    """
+    if size is None:
+        info = fs.info(remote)
+        size = info["size"]
+        etag = info.get("ETag")
+
+    etag = (etag or "").strip('"')
+    before = dest.stat().st_mtime_ns if dest.exists() else None
+
+    # the part file and its state are shared, so only one download of dest can write them at once
+    with exclusive_lock(_lock_file(dest)):
+        if dest.exists() and dest.stat().st_mtime_ns != before and dest.stat().st_size == size:
+            # another download finished it while we waited
+            return
+        _fetch_parts(fs, remote, dest, size, etag, chunk_size, workers, progress)
+        finish(remote, dest, size, etag, verify)
+
+
+def _fetch_parts(fs, remote: str, dest: Path, size: int, etag: str, chunk_size: int, workers: int,
+                 progress: Optional[Callable[[int], None]]):
+    done, todo = prepare(dest, size, etag, chunk_size)
+    lock = threading.Lock()
+
+    def fetch(chunk):
+        i, start, end = chunk
+        block = fs.read_block(remote, start, end - start)
+
+        if len(block) != end - start:
+            raise IOError(f"Short read of {remote} at {start}: expected {end - start} bytes, got {len(block)}")
+
+        write_chunk(dest, start, block)
+
+        with lock:
+            mark_done(dest, size, etag, chunk_size, done, i)
+
+        if progress is not None:
+            progress(end - start)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch, c) for c in todo]
+        try:
+            for f in as_completed(futures):
+                f.result()
+        except BaseException:
+            # the chunks that were written are kept for a resumed download, the rest aren't fetched
+            for f in futures:
+                f.cancel()
+            raise
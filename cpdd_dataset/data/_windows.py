@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import math
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ._batches import chunk_frames, iter_batches
+from ._depth import depth_decoder
+
+
+class Window(NamedTuple):
+    # the first frame of the window
+    start: int
+    # (window, H, W, 3)
+    color: np.ndarray
+    # (window, H, W, 1), or None if depth isn't read
+    depth: Optional[np.ndarray]
+    # (window - 1, 6), relative_pose[i] is frame start + i + 1 relative to frame start + i
+    relative_pose: Optional[np.ndarray]
+
+
+class WindowSampler:
+    """
+    Iterates over windows of consecutive frames, like the (t-1, t, t+1) triplets used to train depth from video.
+    Blocks of frames are read at once and each window is a view into its block, so frames are only read once per
+    epoch.  Blocks start on chunk boundaries when start does, and when they aren't shuffled, the window - stride frames
+    neighbouring blocks share are carried over from the last block instead of read again.  Blocks are read into reused
+    buffers while the previous block's windows are used, so a window is only valid until the windows of the next block.
+    """
+
+    def __init__(self, data, pose=None, window: int = 3, stride: int = 1, block_size: int = 64,
+                 start: int = 0, stop: Optional[int] = None, shuffle: bool = False, seed: Optional[int] = None,
+                 depth: bool = True, prefetch: bool = True, depth_format: str = "raw", **depth_options):
+        """
+        :param data: The Data to read
+        :param pose: The PoseData of the same run, to yield the relative poses within each window
+        :param window: The number of frames in each window
+        :param stride: The number of frames between the starts of consecutive windows
+        :param block_size: About the number of frames read at once, at least window, rounded up so blocks are a
+            whole number of chunks apart
+        :param start: The first frame
+        :param stop: The frame to stop before, defaults to the last frame
+        :param shuffle: Shuffle the order of the blocks, and of the windows in each block, every epoch
+        :param seed: The seed of the shuffle
+        :param depth: Whether to read depth as well as color
+        :param prefetch: Read the next block on a background thread
+        :param depth_format: "raw" for uint16 dm, or "meters" or "inverse" for float32 depth, like Data.batches
+        :param depth_options: Passed to the depth conversion, like max_depth
+        """
+        if window < 1:
+            raise ValueError(f"Window must be at least one frame, got {window}")
+        if stride < 1:
+            raise ValueError(f"Stride must be at least one frame, got {stride}")
+
+        self.data = data
+        self.window = window
+        self.stride = stride
+        self.shuffle = shuffle
+        self.depth = depth
+        self.prefetch = prefetch
+        self._decoder = depth_decoder(depth_format, **depth_options) if depth else None
+        self._rng = np.random.default_rng(seed)
+
+        self.start, self.stop, _ = slice(start, stop).indices(len(data.color))
+        self.starts = np.arange(self.start, self.stop - window + 1, stride)
+        self.windows_per_block = max(1, (max(block_size, window) - window) // stride + 1)
+
+        # consecutive blocks start windows_per_block * stride frames apart, which is kept to whole chunks
+        chunk = chunk_frames(self._datasets)
+        step = chunk // math.gcd(chunk, stride)
+        self.windows_per_block = -(-self.windows_per_block // step) * step
+
+        self.relative_pose: Optional[np.ndarray] = None
+        if pose is not None:
+            if len(pose.relative_pose) < self.stop:
+                raise ValueError(f"Pose data has {len(pose.relative_pose)} frames, expected at least {self.stop}")
+            self.relative_pose = pose.relative_pose[:]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def blocks(self) -> List[np.ndarray]:
+        """
+        :return: The window starts of each block, in order
+        """
+        return [self.starts[i:i + self.windows_per_block] for i in range(0, len(self.starts), self.windows_per_block)]
+
+    @property
+    def _datasets(self) -> tuple:
+        return (self.data.color, self.data.depth) if self.depth else (self.data.color,)
+
+    def _ranges(self, blocks: List[np.ndarray]) -> List[Tuple[int, int]]:
+        return [(int(b[0]), int(b[-1]) + self.window) for b in blocks]
+
+    def _read(self, ranges: Sequence[Tuple[int, int]]) -> Iterator[Tuple[np.ndarray, ...]]:
+        decoders = (None, self._decoder) if self.depth else None
+        return iter_batches(self._datasets, prefetch=self.prefetch, decoders=decoders, ranges=ranges)
+
+    def _carried(self, blocks: List[np.ndarray]) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Reads consecutive blocks, each one's first window - stride frames copied from the end of the last one.
+        """
+        overlap = self.window - self.stride
+        ranges = self._ranges(blocks[:1]) + [(int(b[0]) + overlap, int(b[-1]) + self.window) for b in blocks[1:]]
+
+        buffers: List[np.ndarray] = []
+        length = 0
+        for batch in self._read(ranges):
+            if not buffers:
+                size = (self.windows_per_block - 1) * self.stride + self.window
+                buffers = [np.empty((size,) + b.shape[1:], dtype=b.dtype) for b in batch]
+
+            kept = overlap if length else 0
+            for buf, new in zip(buffers, batch):
+                buf[:kept] = buf[length - kept:length]
+                buf[kept:kept + len(new)] = new
+            length = kept + len(batch[0])
+
+            yield tuple(buf[:length] for buf in buffers)
+
+    def __iter__(self) -> Iterator[Window]:
+        blocks = self.blocks()
+        if self.shuffle:
+            blocks = [blocks[i] for i in self._rng.permutation(len(blocks))]
+
+        # memmaps of repacked files are sliced without reading, so there is nothing to save by carrying frames over
+        if self.shuffle or self.window <= self.stride or all(isinstance(ds, np.ndarray) for ds in self._datasets):
+            batches = self._read(self._ranges(blocks))
+        else:
+            batches = self._carried(blocks)
+
+        for block, batch in zip(blocks, batches):
+            color, depth = batch if self.depth else (batch[0], None)
+            offsets = block - block[0]
+            if self.shuffle:
+                offsets = self._rng.permutation(offsets)
+
+            for offset in offsets.tolist():
+                s = int(block[0]) + offset
+                yield Window(s, color[offset:offset + self.window],
+                             depth[offset:offset + self.window] if depth is not None else None,
+                             self.relative_pose[s + 1:s + self.window] if self.relative_pose is not None else None)
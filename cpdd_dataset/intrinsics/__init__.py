@@ -1 +1,2 @@
-from ._intrinsics import CylindricalIntrinsics, SphericalIntrinsics, PinholeIntrinsics, Intrinsics, Pinhole90Intrinsics
+from ._intrinsics import CylindricalIntrinsics, SphericalIntrinsics, PinholeIntrinsics, Intrinsics, \
+    Pinhole90Intrinsics, ScaledIntrinsics
@@ -1,3 +1,4 @@
+import math
 from abc import ABC, abstractmethod
 import numpy as np
 
@@ -48,6 +49,60 @@ class Intrinsics(ABC):
         K[1, :] /= self.height
         return K
 
+    def scaled(self, factor: float) -> "ScaledIntrinsics":
+        """
+        Gets the intrinsics of these images resized by factor, like the levels of data.build_pyramid.
+        """
+        return ScaledIntrinsics(self, factor)
+
+
+class ScaledIntrinsics(Intrinsics):
+    """
+    The intrinsics of resized images.  Pixel centers stay in place, so the principal point is scaled around the first
+    pixel's center.  Partial pixels at the far edges are cropped, so the width and height are floored, like
+    shape >> level for the levels of data.build_pyramid.  Other attributes, like fov, are the base intrinsics'.
+    """
+
+    def __init__(self, base: Intrinsics, factor: float):
+        self.base = base
+        self.factor = factor
+
+    def __getattr__(self, item):
+        if item == "base":
+            raise AttributeError(item)
+        return getattr(self.base, item)
+
+    def __repr__(self):
+        return f"ScaledIntrinsics({type(self.base).__name__}, factor={self.factor})"
+
+    def scaled(self, factor: float) -> "ScaledIntrinsics":
+        return ScaledIntrinsics(self.base, self.factor * factor)
+
+    @property
+    def height(self) -> int:
+        # the tolerance keeps factors like 0.29 from flooring a whole number of pixels down
+        return int(math.floor(self.base.height * self.factor + 1e-9))
+
+    @property
+    def width(self) -> int:
+        return int(math.floor(self.base.width * self.factor + 1e-9))
+
+    @property
+    def f_x(self) -> np.float32:
+        return np.float32(self.base.f_x * self.factor)
+
+    @property
+    def f_y(self) -> np.float32:
+        return np.float32(self.base.f_y * self.factor)
+
+    @property
+    def c_x(self) -> np.float32:
+        return np.float32((self.base.c_x + 0.5) * self.factor - 0.5)
+
+    @property
+    def c_y(self) -> np.float32:
+        return np.float32((self.base.c_y + 0.5) * self.factor - 0.5)
+
 
 
 class CylindricalIntrinsics(Intrinsics):
@@ -0,0 +1,3 @@
+from ._models import Cube, SIDE_ROTATIONS
+from ._reproject import Lut, lut, lut_dir, reproject
+from ._backproject import backproject, pose_rotations, ray_grid, sample_indices, to_world
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from cpdd_dataset.data._depth import METERS_PER_UNIT
+from cpdd_dataset.intrinsics import Intrinsics
+from ._models import params, pixel_rays, range_scale
+
+_grids: Dict[Tuple[str, int], np.ndarray] = {}
+_grids_lock = threading.Lock()
+
+
+def ray_grid(intrinsics: Intrinsics, size: Optional[Tuple[int, int]] = None, stride: int = 1) -> np.ndarray:
+    """
+    Gets the ray of each pixel, scaled so that multiplying it by the pixel's depth gives its point (so for pinhole
+    images, z is 1).  Grids are cached in memory, and shouldn't be modified.
+
+    :param intrinsics: The intrinsics of the images
+    :param size: The (width, height) of the images, defaults to the intrinsics' size
+    :param stride: Only include every stride-th row and column
+    :return: A (rows * columns, 3) float32 array, in row major order
+    """
+    p = params(intrinsics, size)
+    key = (p.key, stride)
+
+    with _grids_lock:
+        if key in _grids:
+            return _grids[key]
+
+    rays = pixel_rays(p)[::stride, ::stride]
+    grid = (rays * range_scale(p, rays)[..., None]).reshape(-1, 3)
+    grid.setflags(write=False)
+
+    with _grids_lock:
+        return _grids.setdefault(key, grid)
+
+
+def sample_indices(intrinsics: Intrinsics, samples: int, size: Optional[Tuple[int, int]] = None, stride: int = 1,
+                   seed: int = 0) -> np.ndarray:
+    """
+    :return: A sorted random subset of samples pixel indices into ray_grid(intrinsics, size, stride)
+    """
+    pixels = len(ray_grid(intrinsics, size, stride))
+    return np.sort(np.random.default_rng(seed).choice(pixels, size=min(samples, pixels), replace=False))
+
+
+def backproject(depth: np.ndarray, intrinsics: Intrinsics, stride: int = 1, indices: Optional[np.ndarray] = None,
+                out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Turns a batch of depth images into points in the camera frame (x right, y down, z forward).  The sky is left
+    at the far plane, see data.depth_valid_mask to remove it.
+
+    :param depth: A (N, H, W, 1) batch of raw uint16 depth, or float depth in meters
+    :param intrinsics: The intrinsics of the images, which are scaled to their size
+    :param stride: Only use every stride-th row and column
+    :param indices: Only use these pixels, as indices into the strided pixels, like from sample_indices
+    :param out: A (N, pixels, 3) float32 array to write to, allocated if None
+    :return: out
+    """
+    size = (depth.shape[2], depth.shape[1])
+    grid = ray_grid(intrinsics, size, stride)
+
+    depth = depth[:, ::stride, ::stride].reshape(len(depth), -1)
+    if indices is not None:
+        grid = grid[indices]
+        depth = depth[:, indices]
+
+    if out is None:
+        out = np.empty(depth.shape + (3,), dtype=np.float32)
+    elif out.shape != depth.shape + (3,):
+        raise ValueError(f"out has shape {out.shape}, expected {depth.shape + (3,)}")
+
+    scale = METERS_PER_UNIT if not np.issubdtype(depth.dtype, np.floating) else np.float32(1)
+    np.multiply(depth[..., None], grid[None], out=out, dtype=np.float32)
+    if scale != 1:
+        out *= scale
+    return out
+
+
+def pose_rotations(poses: np.ndarray) -> np.ndarray:
+    """
+    The rotation from the camera frame to the world frame for each pose.  The camera looks along the pose's heading,
+    with no roll, so its x axis stays level.
+
+    :param poses: A (N, 6) array of [X, Y, Z, x, y, z] poses, like PoseData.absolute_pose
+    :return: A (N, 3, 3) array of rotations
+    """
+    forward = poses[:, 3:6].astype(np.float64)
+    forward /= np.linalg.norm(forward, axis=-1, keepdims=True)
+
+    # CARLA's world is left handed with z up, so right is up x forward
+    right = np.cross(np.array([0, 0, 1.0]), forward)
+    right /= np.linalg.norm(right, axis=-1, keepdims=True)
+    up = np.cross(forward, right)
+
+    return np.stack([right, -up, forward], axis=-1).astype(np.float32)
+
+
+def to_world(points: np.ndarray, poses: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Transforms points from the camera frame to the world frame, assuming the camera is at the pose's position.
+
+    :param points: A (N, P, 3) batch of points, like from backproject
+    :param poses: A (N, 6) array of [X, Y, Z, x, y, z] poses, like PoseData.absolute_pose
+    :param out: A (N, P, 3) float32 array to write to (which may be points), allocated if None
+    :return: out
+    """
+    if len(points) != len(poses):
+        raise ValueError(f"Got {len(points)} frames of points but {len(poses)} poses")
+
+    rotations = pose_rotations(poses)
+    out = np.matmul(points, rotations.transpose(0, 2, 1), out=out)
+    out += poses[:, None, 0:3].astype(np.float32)
+    return out
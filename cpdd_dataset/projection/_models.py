@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from cpdd_dataset.data import Side
+from cpdd_dataset.intrinsics import CylindricalIntrinsics, Intrinsics, PinholeIntrinsics, ScaledIntrinsics, \
+    SphericalIntrinsics
+
+# Rays are in the camera frame of the front pinhole camera: x right, y down, z forward.
+# Cylindrical and spherical images are centered on z, with x to the right of center.
+
+# the rotation from each cube side's camera frame to the front camera's frame, in Side order
+SIDE_ROTATIONS = np.array([
+    # top: looking up, with the top of the image towards the back
+    [[1, 0, 0], [0, 0, -1], [0, 1, 0]],
+    # bottom: looking down, with the top of the image towards the front
+    [[1, 0, 0], [0, 0, 1], [0, -1, 0]],
+    # left
+    [[0, 0, -1], [0, 1, 0], [1, 0, 0]],
+    # right
+    [[0, 0, 1], [0, 1, 0], [-1, 0, 0]],
+    # front
+    [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+    # back
+    [[-1, 0, 0], [0, 1, 0], [0, 0, -1]],
+], dtype=np.float32)
+
+
+@dataclass(frozen=True)
+class Cube:
+    """
+    The six pinhole sides of a frame, as read by SplitData.cube, as one projection.
+    """
+    face: Intrinsics = field(default_factory=PinholeIntrinsics)
+
+    @property
+    def width(self) -> int:
+        return self.face.width
+
+    @property
+    def height(self) -> int:
+        return self.face.height
+
+
+Model = Union[Intrinsics, Cube]
+
+
+@dataclass(frozen=True)
+class Params:
+    """
+    The parameters of a projection model at some resolution.
+    """
+    model: str
+    f_x: float
+    f_y: float
+    c_x: float
+    c_y: float
+    width: int
+    height: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.model}-{self.width}x{self.height}-{self.f_x:.6g}-{self.f_y:.6g}-{self.c_x:.6g}-{self.c_y:.6g}"
+
+
+def model_name(intrinsics: Intrinsics) -> str:
+    """
+    :return: "pinhole", "cylindrical", or "spherical"
+    """
+    while isinstance(intrinsics, ScaledIntrinsics):
+        intrinsics = intrinsics.base
+
+    if isinstance(intrinsics, CylindricalIntrinsics):
+        return "cylindrical"
+    elif isinstance(intrinsics, SphericalIntrinsics):
+        return "spherical"
+    elif hasattr(intrinsics, "fov"):
+        return "pinhole"
+    else:
+        raise ValueError(f"Unknown projection model for {type(intrinsics).__name__}")
+
+
+def params(intrinsics: Intrinsics, size: Optional[Tuple[int, int]] = None) -> Params:
+    """
+    :param intrinsics: The intrinsics of the model
+    :param size: The (width, height) to scale the intrinsics to, defaults to their own size
+    """
+    width, height = size if size is not None else (intrinsics.width, intrinsics.height)
+    s_x, s_y = width / intrinsics.width, height / intrinsics.height
+
+    # scaled so that pixel centers stay in place
+    return Params(model_name(intrinsics), float(intrinsics.f_x) * s_x, float(intrinsics.f_y) * s_y,
+                  (float(intrinsics.c_x) + 0.5) * s_x - 0.5, (float(intrinsics.c_y) + 0.5) * s_y - 0.5,
+                  width, height)
+
+
+def pixel_rays(p: Params) -> np.ndarray:
+    """
+    :return: A (height, width, 3) float32 array of the unit ray through each pixel
+    """
+    u = (np.arange(p.width, dtype=np.float64) - p.c_x) / p.f_x
+    v = (np.arange(p.height, dtype=np.float64) - p.c_y) / p.f_y
+    u, v = np.meshgrid(u, v)
+
+    if p.model == "pinhole":
+        rays = np.stack([u, v, np.ones_like(u)], axis=-1)
+    elif p.model == "cylindrical":
+        # u is the azimuth, v is the height on a unit cylinder
+        rays = np.stack([np.sin(u), v, np.cos(u)], axis=-1)
+    else:
+        # u is the azimuth, v is the elevation
+        rays = np.stack([np.cos(v) * np.sin(u), np.sin(v), np.cos(v) * np.cos(u)], axis=-1)
+
+    rays /= np.linalg.norm(rays, axis=-1, keepdims=True)
+    return rays.astype(np.float32)
+
+
+def project(p: Params, rays: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param rays: A (..., 3) array of unit rays
+    :return: The (u, v) pixel coordinates of each ray, -1 where the model can't see it
+    """
+    x, y, z = rays[..., 0], rays[..., 1], rays[..., 2]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if p.model == "pinhole":
+            u = p.f_x * x / z + p.c_x
+            v = p.f_y * y / z + p.c_y
+            visible = z > 0
+        else:
+            horizontal = np.hypot(x, z)
+            u = p.f_x * np.arctan2(x, z) + p.c_x
+            period = 2 * np.pi * p.f_x
+            if period <= p.width + 1:
+                # a full circle, so rays behind the camera wrap around the seam instead of falling off the edge
+                u = np.mod(u + 0.5, period) - 0.5
+            if p.model == "cylindrical":
+                v = p.f_y * y / horizontal + p.c_y
+            else:
+                v = p.f_y * np.arctan2(y, horizontal) + p.c_y
+            visible = horizontal > 0
+
+    visible &= (u > -1) & (u < p.width) & (v > -1) & (v < p.height)
+    return np.where(visible, u, -1).astype(np.float32), np.where(visible, v, -1).astype(np.float32)
+
+
+def range_scale(p: Params, rays: np.ndarray) -> np.ndarray:
+    """
+    Depth is measured along z for pinhole images, from the vertical axis for cylindrical images, and along the ray for
+    spherical images.
+
+    :param rays: A (..., 3) array of unit rays
+    :return: The factor to multiply the model's depth by to get the distance along each ray
+    """
+    with np.errstate(divide="ignore"):
+        if p.model == "pinhole":
+            return (1 / rays[..., 2]).astype(np.float32)
+        elif p.model == "cylindrical":
+            return (1 / np.hypot(rays[..., 0], rays[..., 2])).astype(np.float32)
+        else:
+            return np.ones(rays.shape[:-1], dtype=np.float32)
+
+
+def cube_faces(rays: np.ndarray) -> np.ndarray:
+    """
+    :param rays: A (..., 3) array of rays in the front camera's frame
+    :return: The Side value of the cube face each ray goes through
+    """
+    forward = SIDE_ROTATIONS[:, :, 2]
+    return np.argmax(rays @ forward.T, axis=-1)
+
+
+def side_rotation(side: Side) -> np.ndarray:
+    """
+    :return: The rotation from a cube side's camera frame to the front camera's frame
+    """
+    return SIDE_ROTATIONS[side.value]
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from cpdd_dataset.data import get_download_location
+from cpdd_dataset.data._depth import METERS_PER_UNIT, FAR_DEPTH
+from cpdd_dataset.data._transfer import temp_file
+from cpdd_dataset.intrinsics import Intrinsics
+from ._models import SIDE_ROTATIONS, Cube, Model, cube_faces, params, pixel_rays, project, range_scale
+
+
+# bumped when the way tables are built changes, so tables cached on disk by older versions aren't used
+_LUT_VERSION = 2
+
+
+def lut_dir() -> Path:
+    """
+    The directory lookup tables are cached in, in the download location.
+    """
+    return get_download_location() / "luts"
+
+
+@dataclass
+class Lut:
+    """
+    A lookup table from each target pixel to its source pixel.  Cube sources are read as an atlas of the six sides
+    stacked vertically, in Side order.
+
+    :param map_x: The source column of each target pixel, -1 if it isn't visible in the source
+    :param map_y: The source row of each target pixel, -1 if it isn't visible in the source
+    :param depth_scale: The factor converting the source's depth to the target's depth for each pixel
+    """
+    map_x: np.ndarray
+    map_y: np.ndarray
+    depth_scale: np.ndarray
+
+    def __post_init__(self):
+        self._linear = cv2.convertMaps(self.map_x, self.map_y, cv2.CV_16SC2)
+        # cv2's nearest neighbor remap doesn't round fractional fixed point maps, so nearest maps are rounded here
+        self._nearest = cv2.convertMaps(self.map_x, self.map_y, cv2.CV_16SC2, nninterpolation=True)[0]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """
+        The (width, height) of the target.
+        """
+        return self.map_x.shape[1], self.map_x.shape[0]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """
+        The target pixels that are visible in the source.
+        """
+        return self.map_x >= 0
+
+    def remap(self, image: np.ndarray, interpolation: int, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        if interpolation == cv2.INTER_NEAREST:
+            map1, map2 = self._nearest, None
+        else:
+            map1, map2 = self._linear
+        return cv2.remap(image, map1, map2, interpolation, dst=dst, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+_luts: Dict[str, Lut] = {}
+_luts_lock = threading.Lock()
+
+
+def _build(source: Model, target: Intrinsics, size: Optional[Tuple[int, int]]) -> Lut:
+    tgt = params(target, size)
+    rays = pixel_rays(tgt)
+
+    if isinstance(source, Cube):
+        src = params(source.face)
+        faces = cube_faces(rays)
+        # each ray in the frame of its face's camera
+        face_rays = np.einsum("hwi,hwij->hwj", rays, SIDE_ROTATIONS[faces])
+        map_x, map_y = project(src, face_rays)
+        map_y = np.where(map_y >= 0, map_y + faces * src.height, -1).astype(np.float32)
+        scale = range_scale(src, face_rays)
+    else:
+        src = params(source)
+        map_x, map_y = project(src, rays)
+        scale = range_scale(src, rays)
+
+    depth_scale = (scale / range_scale(tgt, rays)).astype(np.float32)
+    return Lut(map_x, map_y, depth_scale)
+
+
+def _key(source: Model, target: Intrinsics, size: Optional[Tuple[int, int]]) -> str:
+    src = f"cube-{params(source.face).key}" if isinstance(source, Cube) else params(source).key
+    return f"v{_LUT_VERSION}_{src}_to_{params(target, size).key}"
+
+
+def lut(source: Model, target: Intrinsics, size: Optional[Tuple[int, int]] = None, cache: bool = True) -> Lut:
+    """
+    Gets the lookup table for reprojecting images.  Tables are cached in memory, and on disk in lut_dir().
+
+    :param source: The intrinsics of the source images, or a Cube of pinhole sides
+    :param target: The intrinsics of the target images
+    :param size: The (width, height) of the target images, defaults to the target intrinsics' size
+    :param cache: Whether to use and save cached tables
+    """
+    if not cache:
+        return _build(source, target, size)
+
+    key = _key(source, target, size)
+    with _luts_lock:
+        if key in _luts:
+            return _luts[key]
+
+    file = lut_dir() / f"{key}.npz"
+    if file.exists():
+        with np.load(file) as f:
+            table = Lut(f["map_x"], f["map_y"], f["depth_scale"])
+    else:
+        table = _build(source, target, size)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        part = temp_file(file)
+        with open(part, "wb") as f:
+            np.savez(f, map_x=table.map_x, map_y=table.map_y, depth_scale=table.depth_scale)
+        os.replace(part, file)
+
+    with _luts_lock:
+        return _luts.setdefault(key, table)
+
+
+def _convert_depth(depth: np.ndarray, scale: np.ndarray, dst: np.ndarray):
+    if np.issubdtype(dst.dtype, np.floating):
+        np.multiply(depth, scale, out=dst)
+        return
+
+    # the sky stays at the far plane, and nothing else is moved past it
+    far = int(round(FAR_DEPTH / METERS_PER_UNIT))
+    converted = np.rint(depth * scale)
+    np.minimum(converted, far - 1, out=converted)
+    dst[...] = np.where(depth >= far, far, converted)
+
+
+def reproject(images: np.ndarray, source: Model, target: Intrinsics, size: Optional[Tuple[int, int]] = None,
+              depth: bool = False, out: Optional[np.ndarray] = None, workers: int = 1,
+              cache: bool = True) -> np.ndarray:
+    """
+    Reprojects a batch of images, like a cube of pinhole sides to a cylindrical image.  Color is interpolated
+    bilinearly.  Depth is sampled from the nearest pixel and converted to the target's depth (pinhole depth is along z,
+    cylindrical depth is from the vertical axis, and spherical depth is along the ray).  Pixels the source can't see
+    are 0.
+
+    :param images: A (N, H, W, C) batch, or (N, 6, H, W, C) for a Cube source
+    :param source: The intrinsics of the source images, or a Cube of pinhole sides
+    :param target: The intrinsics of the target images
+    :param size: The (width, height) of the target images, defaults to the target intrinsics' size
+    :param depth: Whether the images are depth
+    :param out: A (N, height, width, C) array to write to, allocated if None
+    :param workers: The number of threads to reproject frames on
+    :param cache: Whether to use and save cached lookup tables
+    :return: out
+    """
+    table = lut(source, target, size, cache)
+    width, height = table.size
+
+    if isinstance(source, Cube):
+        if images.ndim != 5 or images.shape[1] != 6:
+            raise ValueError(f"Expected a (N, 6, H, W, C) batch of cube sides, got {images.shape}")
+        images = images.reshape((images.shape[0], -1) + images.shape[3:])
+
+    shape = (images.shape[0], height, width) + images.shape[3:]
+    if out is None:
+        out = np.empty(shape, dtype=images.dtype)
+    elif out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+    def frame(i: int):
+        # cv2 drops single channel dimensions
+        dst = out[i, ..., 0] if out.shape[-1] == 1 else out[i]
+        if depth:
+            _convert_depth(table.remap(images[i], cv2.INTER_NEAREST), table.depth_scale, dst)
+        else:
+            table.remap(images[i], cv2.INTER_LINEAR, dst)
+
+    if workers <= 1:
+        for i in range(len(images)):
+            frame(i)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(frame, range(len(images))))
+
+    return out
@@ -0,0 +1,59 @@
+import h5py
+import numpy as np
+
+from cpdd_dataset.data._batches import coalesce, iter_batches
+
+
+def _file(frames: int = 20) -> h5py.File:
+    # each frame is filled with its index
+    f = h5py.File("batches.hdf5", "w", driver="core", backing_store=False)
+    index = np.arange(frames)[:, None, None, None]
+    f.create_dataset("color", data=(index * np.ones((1, 2, 2, 3))).astype(np.uint8), chunks=(4, 2, 2, 3))
+    f.create_dataset("depth", data=(index * np.ones((1, 2, 2, 1))).astype(np.uint16), chunks=(4, 2, 2, 1))
+    return f
+
+
+def test_coalesce_splits_runs_of_consecutive_frames():
+    assert coalesce(np.array([3, 4, 5, 9, 10, 2, 7])) == [(3, 6), (9, 11), (2, 3), (7, 8)]
+    assert coalesce(np.array([], dtype=np.int64)) == []
+
+
+def test_batches_follow_chunks():
+    with _file() as f:
+        batches = [c[:, 0, 0, 0].tolist() for c, _ in iter_batches((f["color"], f["depth"]), 5, start=2, stop=17)]
+
+    # 5 frames are rounded up to 2 chunks, and batch boundaries are multiples of that
+    assert batches == [list(range(2, 8)), list(range(8, 16)), [16]]
+
+
+def test_frames_are_read_in_order():
+    frames = np.array([1, 2, 3, 10, 0, 19, 18])
+
+    for prefetch in (True, False):
+        with _file() as f:
+            batches = [(c[:, 0, 0, 0].copy(), d[:, 0, 0, 0].copy())
+                       for c, d in iter_batches((f["color"], f["depth"]), 3, frames=frames, prefetch=prefetch)]
+
+        assert [c.tolist() for c, _ in batches] == [[1, 2, 3], [10, 0, 19], [18]]
+        np.testing.assert_array_equal(np.concatenate([d for _, d in batches]), frames)
+
+
+def test_ranges_may_overlap_and_need_no_batch_size():
+    ranges = [(4, 9), (0, 3), (7, 12), (5, 5)]
+
+    with _file() as f:
+        batches = [c[:, 0, 0, 0].tolist() for (c,) in iter_batches([f["color"]], ranges=ranges)]
+
+    assert batches == [list(range(4, 9)), list(range(0, 3)), list(range(7, 12))]
+
+
+def test_decoders_run_on_their_dataset():
+    def double(raw, out):
+        np.multiply(raw, 2, out=out)
+        return out
+
+    with _file() as f:
+        [(color, depth)] = list(iter_batches((f["color"], f["depth"]), 8, stop=4, decoders=(None, double)))
+
+    assert color.dtype == np.uint8 and depth.dtype == np.float32
+    np.testing.assert_array_equal(depth[:, 0, 0, 0], np.arange(4) * 2)
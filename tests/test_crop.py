@@ -0,0 +1,21 @@
+import cv2
+import numpy as np
+
+from cpdd_dataset.data import crop_pinhole_to_90, crop_pinhole_to_90_batch
+from cpdd_dataset.intrinsics import Pinhole90Intrinsics, PinholeIntrinsics
+
+
+def _float_maps():
+    src, dst = PinholeIntrinsics(), Pinhole90Intrinsics()
+    u = (np.arange(dst.width, dtype=np.float32) - dst.c_x) / dst.f_x * src.f_x + src.c_x
+    v = (np.arange(dst.height, dtype=np.float32) - dst.c_y) / dst.f_y * src.f_y + src.c_y
+    return np.meshgrid(u, v)
+
+
+def test_depth_crop_matches_float_nearest_remap():
+    depth = np.random.default_rng(0).integers(0, 10000, (2, 768, 768, 1)).astype(np.uint16)
+    map_x, map_y = _float_maps()
+    expected = np.stack([cv2.remap(d, map_x, map_y, cv2.INTER_NEAREST) for d in depth])[..., None]
+
+    np.testing.assert_array_equal(crop_pinhole_to_90(depth[0])[..., None], expected[0])
+    np.testing.assert_array_equal(crop_pinhole_to_90_batch(depth), expected)
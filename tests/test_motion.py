@@ -0,0 +1,44 @@
+import numpy as np
+
+from cpdd_dataset.data import MotionFilter
+
+
+def _poses(steps, turns=None):
+    # steps and turns are the meters moved and degrees turned since the previous frame
+    steps = np.asarray(steps, dtype=np.float64)
+    relative = np.zeros((len(steps), 6))
+    relative[:, 0] = steps
+
+    angles = np.radians(np.cumsum(turns if turns is not None else np.zeros(len(steps))))
+    absolute = np.zeros((len(steps), 6))
+    absolute[:, 3], absolute[:, 5] = np.sin(angles), np.cos(angles)
+    return relative, absolute
+
+
+def test_no_filter_keeps_every_frame():
+    assert MotionFilter().mask(*_poses([0, 0, 0.5, 0])).all()
+    assert MotionFilter().mask(*_poses([])).shape == (0,)
+
+
+def test_thresholds_keep_frames_that_moved_or_turned():
+    relative, absolute = _poses([0, 0.5, 0.01, 0.01, 0.2], [0, 0, 5, 0.1, 0])
+
+    np.testing.assert_array_equal(MotionFilter(min_translation=0.1).mask(relative, absolute), [1, 1, 0, 0, 1])
+    np.testing.assert_array_equal(MotionFilter(min_rotation=1).mask(relative, absolute), [1, 0, 1, 0, 0])
+    np.testing.assert_array_equal(MotionFilter(min_translation=0.1, min_rotation=1).mask(relative, absolute),
+                                  [1, 1, 1, 0, 1])
+
+
+def test_spacing_keeps_the_first_frame_of_each_stretch():
+    # driven: 0, 0.5, 0.55, 0.6, 1.2, 1.25, 1.75, 2.25
+    relative, absolute = _poses([0, 0.5, 0.05, 0.05, 0.6, 0.05, 0.5, 0.5])
+
+    np.testing.assert_array_equal(MotionFilter(spacing=1.0).mask(relative, absolute), [1, 0, 0, 0, 1, 0, 0, 1])
+
+
+def test_spacing_applies_to_frames_that_pass_the_thresholds():
+    # driven: 0, 0.98, 1.03, 1.53, 1.58, 2.5.  Frame 2 starts the second meter but barely moved.
+    relative, absolute = _poses([0, 0.98, 0.05, 0.5, 0.05, 0.92])
+
+    np.testing.assert_array_equal(MotionFilter(min_translation=0.1, spacing=1.0).mask(relative, absolute),
+                                  [1, 0, 0, 1, 0, 1])
@@ -0,0 +1,49 @@
+import numpy as np
+
+from cpdd_dataset.data import PoseIndex
+from cpdd_dataset.data._pose_index import POSE_DTYPE
+
+
+def _index(cell_size: float = 10.0):
+    rng = np.random.default_rng(0)
+    configs = ["a", "b", "c"]
+    poses = np.zeros(600, dtype=POSE_DTYPE)
+    poses["config"] = np.repeat(np.arange(len(configs)), 200)
+    poses["frame"] = np.tile(np.arange(200), len(configs))
+    poses["xyz"] = rng.uniform(-100, 100, (600, 3)) * [1, 1, 0.05]
+    return PoseIndex(configs, poses, cell_size), poses, configs
+
+
+def _brute_force(poses, configs, point, exclude=None):
+    keep = np.ones(len(poses), dtype=bool) if exclude is None else poses["config"] != configs.index(exclude)
+    distances = np.linalg.norm(poses["xyz"][keep] - np.asarray(point, dtype=np.float32), axis=1)
+    refs = [(configs[c], int(f)) for c, f in zip(poses["config"][keep], poses["frame"][keep])]
+    order = np.argsort(distances, kind="stable")
+    return [refs[i] for i in order], distances[order]
+
+
+def test_radius_matches_brute_force():
+    index, poses, configs = _index()
+
+    for point, radius, exclude in [((0, 0, 0), 15.0, None), ((55.5, -20, 1), 32.0, "b"), ((500, 500, 0), 10.0, None)]:
+        refs, distances = _brute_force(poses, configs, point, exclude)
+        expected = [r for r, d in zip(refs, distances) if d <= radius]
+
+        found = index.radius(point, radius, exclude=exclude)
+
+        assert [(r.config, r.frame) for r in found] == expected
+        np.testing.assert_allclose([r.distance for r in found], distances[:len(expected)], rtol=1e-6)
+
+
+def test_knn_matches_brute_force():
+    for cell_size in (1.0, 10.0, 1000.0):
+        index, poses, configs = _index(cell_size)
+
+        for point, k, exclude in [((0, 0, 0), 5, None), ((99, 99, 0), 40, "a"), ((-300, 0, 0), 3, None),
+                                  ((0, 0, 0), 1000, "c")]:
+            refs, distances = _brute_force(poses, configs, point, exclude)
+
+            found = index.knn(point, k, exclude=exclude)
+
+            assert [(r.config, r.frame) for r in found] == refs[:k]
+            np.testing.assert_allclose([r.distance for r in found], distances[:k], rtol=1e-6)
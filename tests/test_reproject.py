@@ -0,0 +1,13 @@
+import numpy as np
+
+from cpdd_dataset.intrinsics import CylindricalIntrinsics
+from cpdd_dataset.projection import reproject
+
+
+def test_identity_depth_reprojection_round_trips():
+    intrinsics = CylindricalIntrinsics()
+    depth = np.random.default_rng(0).integers(1, 10000, (1, intrinsics.height, intrinsics.width, 1)).astype(np.uint16)
+
+    out = reproject(depth, intrinsics, intrinsics, depth=True, cache=False)
+
+    np.testing.assert_array_equal(out, depth)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from cpdd_dataset.data import ChannelMoments, DepthHistogram
+
+
+def test_merged_moments_match_numpy():
+    rng = np.random.default_rng(0)
+    batches = [rng.integers(0, 256, (n, 4, 4, 3)).astype(np.uint8) for n in (1, 3, 7)]
+    floats = rng.normal(5, 2, (50, 3))
+
+    for pieces in (batches, [floats[:10], floats[10:11], floats[11:]]):
+        moments = ChannelMoments()
+        for piece in pieces:
+            moments = moments.update(piece)
+        pixels = np.concatenate([p.reshape(-1, 3) for p in pieces]).astype(np.float64)
+
+        assert moments.count == len(pixels)
+        np.testing.assert_allclose(moments.mean, pixels.mean(axis=0))
+        np.testing.assert_allclose(moments.variance, pixels.var(axis=0))
+
+
+def test_merge_is_order_independent_and_ignores_empty_moments():
+    rng = np.random.default_rng(1)
+    a = ChannelMoments().update(rng.normal(0, 1, (20, 2)))
+    b = ChannelMoments().update(rng.normal(10, 3, (5, 2)))
+
+    ab, ba = a.merge(b), b.merge(a)
+    np.testing.assert_allclose(ab.mean, ba.mean)
+    np.testing.assert_allclose(ab.m2, ba.m2)
+    assert a.merge(ChannelMoments()) is a and ChannelMoments().merge(a) is a
+
+
+def test_depth_histogram_matches_numpy():
+    raw = np.random.default_rng(2).integers(0, 10000, (3, 8, 8, 1)).astype(np.uint16)
+    raw[0, 0, 0, 0] = 500
+    histogram = DepthHistogram().update(raw[:1]).merge(DepthHistogram().update(raw[1:]))
+    meters = raw.astype(np.float64) / 10
+
+    # whole meters are exact, so pixels on an edge, like the 50 m one, fall in the same bin as np.histogram's
+    for edges in ([0, 1, 10, 50, 100, 1000], np.linspace(0, 1000, 17), [20, 30.5, 50]):
+        expected, _ = np.histogram(meters, edges)
+        np.testing.assert_array_equal(histogram.histogram(edges), expected)
+
+    assert histogram.count == raw.size
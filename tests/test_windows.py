@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+import pytest
+
+from cpdd_dataset.data import WindowSampler
+
+
+@pytest.fixture
+def run():
+    # each frame and pose is filled with its index
+    frames = 41
+    index = np.arange(frames)[:, None, None, None]
+    with h5py.File("windows.hdf5", "w", driver="core", backing_store=False) as f:
+        f.create_dataset("rgb", data=(index * np.ones((1, 2, 2, 3))).astype(np.uint8), chunks=(4, 2, 2, 3))
+        f.create_dataset("depth", data=(index * np.ones((1, 2, 2, 1))).astype(np.uint16), chunks=(4, 2, 2, 1))
+        data = SimpleNamespace(color=f["rgb"], depth=f["depth"])
+        pose = SimpleNamespace(relative_pose=np.arange(frames, dtype=np.float32)[:, None] * np.ones((1, 6), np.float32))
+        yield data, pose
+
+
+@pytest.mark.parametrize("options", [
+    dict(),
+    dict(window=5, stride=3, block_size=10),
+    dict(window=4, stride=2, block_size=6, prefetch=False),
+    dict(window=7, stride=3, block_size=3, start=2, stop=37),
+    dict(window=3, block_size=8, shuffle=True, seed=1),
+])
+def test_windows_line_up_with_frames_and_poses(run, options):
+    data, pose = run
+    sampler = WindowSampler(data, pose, **options)
+
+    starts = []
+    for w in sampler:
+        frames = np.arange(w.start, w.start + sampler.window)
+        np.testing.assert_array_equal(w.color[:, 0, 0, 0], frames)
+        np.testing.assert_array_equal(w.depth[:, 0, 0, 0], frames)
+        # relative_pose[i] is frame start + i + 1 relative to frame start + i
+        np.testing.assert_array_equal(w.relative_pose[:, 0], frames[1:])
+        starts.append(w.start)
+
+    assert sorted(starts) == sampler.starts.tolist()
+    assert len(starts) == len(sampler)
+    if not sampler.shuffle:
+        assert starts == sampler.starts.tolist()
+
+
+def test_blocks_are_a_whole_number_of_chunks_apart(run):
+    data, pose = run
+
+    for stride in (1, 2, 3):
+        sampler = WindowSampler(data, pose, stride=stride, block_size=5)
+        assert sampler.windows_per_block * stride % 4 == 0
+
+
+def test_short_pose_data_is_rejected(run):
+    data, pose = run
+
+    with pytest.raises(ValueError):
+        WindowSampler(data, SimpleNamespace(relative_pose=pose.relative_pose[:10]))